@@ -1,6 +1,4 @@
 
-import firebase_admin
-from firebase_admin import auth, credentials
 import os
 from fastapi import Header, HTTPException, Depends
 from dotenv import load_dotenv
@@ -20,24 +18,41 @@ import json
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SERVICE_ACCOUNT_KEY_PATH = os.path.join(BASE_DIR, "serviceAccountKey.json")
 
-cred = None
-if os.path.exists(SERVICE_ACCOUNT_KEY_PATH):
-    cred = credentials.Certificate(SERVICE_ACCOUNT_KEY_PATH)
-elif os.getenv("FIREBASE_SERVICE_ACCOUNT"):
-    # Load credentials from environment variable (JSON string)
+_firebase_initialized = False
+
+
+def _firebase_auth():
+    """
+    Returns firebase_admin.auth, initializing the Admin SDK on first use.
+    firebase_admin is slow to import, so it stays out of the API's cold start until a request needs it.
+    """
+    global _firebase_initialized
+    import firebase_admin
+    from firebase_admin import auth, credentials
+
+    if _firebase_initialized:
+        return auth
+    _firebase_initialized = True
+
+    cred = None
+    if os.path.exists(SERVICE_ACCOUNT_KEY_PATH):
+        cred = credentials.Certificate(SERVICE_ACCOUNT_KEY_PATH)
+    elif os.getenv("FIREBASE_SERVICE_ACCOUNT"):
+        # Load credentials from environment variable (JSON string)
+        try:
+            service_account_info = json.loads(os.getenv("FIREBASE_SERVICE_ACCOUNT"))
+            cred = credentials.Certificate(service_account_info)
+        except Exception as e:
+             print(f"Warning: Failed to parse FIREBASE_SERVICE_ACCOUNT: {e}")
+    else:
+        print(f"Warning: serviceAccountKey.json not found at {SERVICE_ACCOUNT_KEY_PATH} and FIREBASE_SERVICE_ACCOUNT not set")
+
     try:
-        service_account_info = json.loads(os.getenv("FIREBASE_SERVICE_ACCOUNT"))
-        cred = credentials.Certificate(service_account_info)
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(cred)
     except Exception as e:
-         print(f"Warning: Failed to parse FIREBASE_SERVICE_ACCOUNT: {e}")
-else:
-    print(f"Warning: serviceAccountKey.json not found at {SERVICE_ACCOUNT_KEY_PATH} and FIREBASE_SERVICE_ACCOUNT not set")
-
-try:
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(cred)
-except Exception as e:
-    print(f"Warning: Firebase Admin failed to initialize: {e}")
+        print(f"Warning: Firebase Admin failed to initialize: {e}")
+    return auth
 
 async def get_current_user(authorization: str = Header(None)):
     """
@@ -55,10 +70,16 @@ async def get_current_user(authorization: str = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid Authorization Header Format")
 
     token = authorization.split("Bearer ")[1]
+    return verify_token(token)
 
+def verify_token(token: str) -> str:
+    """
+    Verifies a Firebase ID token and returns the user's UID.
+    Shared by the Authorization header dependency and the WebSocket endpoint (which gets the token as a query parameter).
+    """
     try:
         # Verify the ID token
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = _firebase_auth().verify_id_token(token)
         uid = decoded_token['uid']
         return uid
     except Exception as e:
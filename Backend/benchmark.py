@@ -0,0 +1,278 @@
+"""
+Benchmarks for the analysis pipeline, meant to be run against the local Gemini stub.
+
+    uvicorn stub_server:app --port 8100
+    ANALYSIS_STUB_URL=http://127.0.0.1:8100 python benchmark.py stream path/to/image.jpg
+
+`startup` needs no stub; it exits with status 1 when the cold-start budget is exceeded:
+
+    python benchmark.py startup --max-import-ms 1500 --max-first-response-ms 3000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from services.analysis_service import AnalysisService
+from services.concurrency import model_call_limiter
+from services.packing import ImageBatcher
+from services.phash import MultiIndexHashTable
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f} ms"
+
+
+def _require_stub():
+    if not os.getenv("ANALYSIS_STUB_URL"):
+        print("ANALYSIS_STUB_URL is not set; refusing to benchmark against the real Gemini API.")
+        sys.exit(2)
+
+
+async def bench_stream(args):
+    """Time-to-first-defect of the streaming path vs. latency of the blocking path."""
+    _require_stub()
+    service = AnalysisService()
+
+    blocking, first_defect, streamed = [], [], []
+    for i in range(args.runs):
+        start = time.perf_counter()
+        await service.analyze_image(args.image)
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        first = None
+        async for kind, _ in service.stream_analyze_image(args.image):
+            if kind == "defect" and first is None:
+                first = time.perf_counter() - start
+        streamed.append(time.perf_counter() - start)
+        first_defect.append(first if first is not None else streamed[-1])
+        print(f"run {i + 1}: blocking={_ms(blocking[-1])} first_defect={_ms(first_defect[-1])} stream_total={_ms(streamed[-1])}")
+
+    print("\nMedian over", args.runs, "runs")
+    print(f"  blocking analyze_image:  {_ms(statistics.median(blocking))}")
+    print(f"  streaming first defect:  {_ms(statistics.median(first_defect))}")
+    print(f"  streaming full result:   {_ms(statistics.median(streamed))}")
+
+
+async def _stub_stats(reset: bool = False) -> dict:
+    async with httpx.AsyncClient(base_url=os.environ["ANALYSIS_STUB_URL"]) as client:
+        response = await client.post("/stats/reset") if reset else await client.get("/stats")
+        return response.json()
+
+
+async def _burst(service: AnalysisService, image: str, requests: int) -> dict:
+    await _stub_stats(reset=True)
+    start = time.perf_counter()
+    results = await asyncio.gather(*[service.analyze_image(image) for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+    stub = await _stub_stats()
+    return {
+        "elapsed": elapsed,
+        "succeeded": sum(1 for r in results if not r.get("error")),
+        "failed": sum(1 for r in results if r.get("error")),
+        "model_calls": stub["accepted"] + stub["rejected"],
+        "stub_429s": stub["rejected"],
+        "peak_concurrency": stub["peak_concurrency"],
+    }
+
+
+async def bench_limiter(args):
+    """A burst of uploads with and without the adaptive limiter.
+    Start the stub with a quota, e.g. STUB_MAX_CONCURRENT=4 or STUB_QUOTA_RPM=60."""
+    _require_stub()
+    service = AnalysisService()
+
+    for enabled in (False, True):
+        model_call_limiter.enabled = enabled
+        report = await _burst(service, args.image, args.requests)
+        label = "with limiter" if enabled else "without limiter"
+        print(f"\n{label}: {args.requests} analyses in {_ms(report['elapsed'])}")
+        print(f"  succeeded={report['succeeded']} failed={report['failed']}")
+        print(f"  model calls={report['model_calls']} 429s={report['stub_429s']} peak concurrency={report['peak_concurrency']}")
+        if enabled:
+            print(f"  limiter: {model_call_limiter.metrics()}")
+
+
+def _tokens(usage: list) -> int:
+    return sum(record["total_tokens"] for record in usage)
+
+
+async def bench_packing(args):
+    """Model requests and tokens for N concurrent uploads, one request each vs. packed."""
+    _require_stub()
+    service = AnalysisService()
+    images = [args.images[i % len(args.images)] for i in range(args.uploads)]
+
+    await _stub_stats(reset=True)
+    single_usage = []
+    start = time.perf_counter()
+    await asyncio.gather(*[service.analyze_image(image, usage=single_usage) for image in images])
+    single_elapsed = time.perf_counter() - start
+    single_calls = (await _stub_stats())["accepted"]
+
+    await _stub_stats(reset=True)
+    batcher = ImageBatcher(service, max_images=args.max_images, window_seconds=args.window_ms / 1000)
+    packed_usage = []
+    start = time.perf_counter()
+    await asyncio.gather(*[batcher.analyze(image, usage=packed_usage) for image in images])
+    packed_elapsed = time.perf_counter() - start
+    packed_calls = (await _stub_stats())["accepted"]
+
+    print(f"{args.uploads} uploads, up to {args.max_images} images per packed request")
+    print(f"  single: {single_calls} requests, {_tokens(single_usage)} tokens, {_ms(single_elapsed)}")
+    print(f"  packed: {packed_calls} requests, {_tokens(packed_usage)} tokens, {_ms(packed_elapsed)}")
+    if single_calls and _tokens(single_usage):
+        print(f"  saved:  {1 - packed_calls / single_calls:.0%} of requests, "
+              f"{1 - _tokens(packed_usage) / _tokens(single_usage):.0%} of tokens")
+    print(f"  batcher: {batcher.metrics()}")
+
+
+async def bench_phash(args):
+    """Lookup latency of the near-duplicate hash index (no stub needed)."""
+    import random
+    rng = random.Random(0)
+    table = MultiIndexHashTable(args.max_distance)
+    for item in range(args.hashes):
+        table.add(rng.getrandbits(64), item)
+
+    queries = [rng.getrandbits(64) for _ in range(args.queries)]
+    start = time.perf_counter()
+    for query in queries:
+        table.search(query)
+    per_query = (time.perf_counter() - start) / len(queries)
+    print(f"{args.hashes} hashes, max distance {args.max_distance}: {per_query * 1e6:.1f} us per lookup")
+
+
+# Modules that must not be imported until a request actually needs them
+HEAVY_MODULES = [
+    "langchain_google_genai",
+    "langchain_core",
+    "google.generativeai",
+    "reportlab",
+    "firebase_admin",
+    "numpy",
+    "PIL",
+    "cv2",
+]
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_seconds": elapsed, "heavy": [name for name in json.loads(sys.argv[1]) if name in sys.modules]}))
+"""
+
+
+async def _first_response(port: int, env: dict, timeout: float) -> float:
+    """Seconds from spawning uvicorn until /health answers."""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        async with httpx.AsyncClient() as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    response = await client.get(f"http://127.0.0.1:{port}/health")
+                    if response.status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.01)
+        raise TimeoutError(f"/health did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def bench_startup(args):
+    """Cold-start cost of the API: import time of main.py and time to first response, each in a fresh process."""
+    env = {**os.environ, "AUTO_MIGRATE": "0"}
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    import_times, heavy = [], set()
+    for i in range(args.runs):
+        probe = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE, json.dumps(HEAVY_MODULES)],
+            cwd=cwd, env=env, capture_output=True, text=True, check=True,
+        )
+        # main.py prints its own warnings; the probe's JSON is the last line
+        result = json.loads(probe.stdout.strip().splitlines()[-1])
+        import_times.append(result["import_seconds"])
+        heavy.update(result["heavy"])
+
+    first_responses = [await _first_response(args.port, env, args.timeout) for i in range(args.runs)]
+
+    import_ms = statistics.median(import_times) * 1000
+    first_response_ms = statistics.median(first_responses) * 1000
+    print(f"import main (median of {args.runs}):       {import_ms:.0f} ms (budget {args.max_import_ms:.0f} ms)")
+    print(f"time to first response (median of {args.runs}): {first_response_ms:.0f} ms (budget {args.max_first_response_ms:.0f} ms)")
+    print(f"heavy modules loaded at import:   {', '.join(sorted(heavy)) or 'none'}")
+
+    failures = []
+    if import_ms > args.max_import_ms:
+        failures.append("import time over budget")
+    if first_response_ms > args.max_first_response_ms:
+        failures.append("time to first response over budget")
+    if heavy:
+        failures.append("heavy modules imported eagerly")
+    if failures:
+        print(f"FAIL: {'; '.join(failures)}")
+        return 1
+    print("OK")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    stream = sub.add_parser("stream", help="Time-to-first-defect for /upload/stream")
+    stream.add_argument("image")
+    stream.add_argument("--runs", type=int, default=5)
+    stream.set_defaults(func=bench_stream)
+
+    limiter = sub.add_parser("limiter", help="Burst behaviour against a quota-limited stub")
+    limiter.add_argument("image")
+    limiter.add_argument("--requests", type=int, default=50)
+    limiter.set_defaults(func=bench_limiter)
+
+    packing = sub.add_parser("packing", help="Request/token savings of multi-image packing")
+    packing.add_argument("images", nargs="+")
+    packing.add_argument("--uploads", type=int, default=16)
+    packing.add_argument("--max-images", type=int, default=4)
+    packing.add_argument("--window-ms", type=float, default=500)
+    packing.set_defaults(func=bench_packing)
+
+    phash = sub.add_parser("phash", help="Near-duplicate index lookup latency")
+    phash.add_argument("--hashes", type=int, default=10000)
+    phash.add_argument("--queries", type=int, default=1000)
+    phash.add_argument("--max-distance", type=int, default=6)
+    phash.set_defaults(func=bench_phash)
+
+    startup = sub.add_parser("startup", help="Cold-start import time and time to first response")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--port", type=int, default=8199)
+    startup.add_argument("--timeout", type=float, default=30)
+    startup.add_argument("--max-import-ms", type=float, default=1500)
+    startup.add_argument("--max-first-response-ms", type=float, default=3000)
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    sys.exit(asyncio.run(args.func(args)) or 0)
+
+
+if __name__ == "__main__":
+    main()
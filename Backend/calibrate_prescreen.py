@@ -0,0 +1,120 @@
+"""
+Builds and checks pre-screen profiles (see services/prescreen.py).
+
+Calibrate a product from known-good and known-defective images:
+    python calibrate_prescreen.py calibrate --product bracket-a --golden data/bracket-a/good --defective data/bracket-a/bad
+
+Check a saved profile against a separate labelled test set (exit code 1 if recall is below --min-recall):
+    python calibrate_prescreen.py evaluate --product bracket-a --golden data/test/good --defective data/test/bad
+"""
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+
+from services.prescreen import PrescreenProfile
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def list_images(directory: str):
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def pick_threshold(defective_scores: np.ndarray, min_recall: float) -> float:
+    """
+    Highest threshold that still sends at least `min_recall` of the defective images to the model
+    (an image is auto-passed only when its score is strictly below the threshold).
+    """
+    ordered = np.sort(defective_scores)
+    allowed_misses = int(np.floor((1 - min_recall) * len(ordered) + 1e-9))
+    return float(ordered[allowed_misses])
+
+
+def report(profile: PrescreenProfile, golden, defective) -> float:
+    golden_scores = np.array([profile.score(path) for path in golden])
+    defective_scores = np.array([profile.score(path) for path in defective])
+    skip_rate = float(np.mean(golden_scores < profile.threshold)) if len(golden_scores) else 0.0
+    recall = float(np.mean(defective_scores >= profile.threshold)) if len(defective_scores) else 0.0
+    print(f"  threshold:             {profile.threshold:.4f}")
+    print(f"  golden images:         {len(golden_scores)} (skip rate {skip_rate:.1%})")
+    print(f"  defective images:      {len(defective_scores)} (recall {recall:.1%})")
+    return recall
+
+
+def calibrate(args):
+    golden = list_images(args.golden)
+    defective = list_images(args.defective)
+    if len(golden) < 5 or not defective:
+        print("Need at least 5 golden images and 1 defective image.")
+        return 2
+
+    # Hold out part of the golden set so the reported skip rate isn't measured on training images
+    random.Random(0).shuffle(golden)
+    holdout_count = max(1, int(len(golden) * args.holdout))
+    holdout, train = golden[:holdout_count], golden[holdout_count:]
+
+    profile = PrescreenProfile.fit(args.product, train)
+    defective_scores = np.array([profile.score(path) for path in defective])
+    profile.threshold = pick_threshold(defective_scores, args.min_recall) * args.margin
+
+    print(f"Calibration for '{args.product}' (fit on {len(train)} golden images, held out {len(holdout)}):")
+    report(profile, holdout, defective)
+
+    # Final profile uses every golden image. Scores depend on the profile's statistics, so the threshold
+    # is recalibrated on it, and the saved profile is what the recall requirement is checked against.
+    profile = PrescreenProfile.fit(args.product, golden)
+    defective_scores = np.array([profile.score(path) for path in defective])
+    profile.threshold = pick_threshold(defective_scores, args.min_recall) * args.margin
+
+    print(f"Final profile (fit on all {len(golden)} golden images; skip rate is in-sample):")
+    recall = report(profile, golden, defective)
+    if recall < args.min_recall:
+        print(f"FAIL: recall {recall:.1%} is below the required {args.min_recall:.1%}; profile not saved")
+        return 1
+    path = profile.save(args.profile_dir)
+    print(f"Saved profile to {path}")
+    return 0
+
+
+def evaluate(args):
+    profile = PrescreenProfile.load(args.profile_dir, args.product)
+    if profile is None:
+        print(f"No profile for '{args.product}' in {args.profile_dir}")
+        return 2
+
+    print(f"Evaluation of '{args.product}':")
+    recall = report(profile, list_images(args.golden), list_images(args.defective))
+    if recall < args.min_recall:
+        print(f"FAIL: recall {recall:.1%} is below the required {args.min_recall:.1%}")
+        return 1
+    print("OK")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, func in (("calibrate", calibrate), ("evaluate", evaluate)):
+        command = sub.add_parser(name)
+        command.add_argument("--product", required=True)
+        command.add_argument("--golden", required=True, help="Directory of known-good images")
+        command.add_argument("--defective", required=True, help="Directory of known-defective images")
+        command.add_argument("--min-recall", type=float, default=0.98, help="Share of defective images that must reach the model")
+        command.add_argument("--profile-dir", default=os.getenv("PRESCREEN_PROFILE_DIR", "prescreen_profiles"))
+        command.set_defaults(func=func)
+    sub.choices["calibrate"].add_argument("--holdout", type=float, default=0.2, help="Share of golden images held out for reporting")
+    sub.choices["calibrate"].add_argument("--margin", type=float, default=0.9, help="Safety factor applied to the calibrated threshold")
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
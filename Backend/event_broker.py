@@ -0,0 +1,63 @@
+"""
+Local stand-in for a pub/sub broker, for running several API workers on one host.
+
+Each worker connects over TCP and sends its inspection events as JSON lines. The broker assigns the
+next event id and sends the event to every connected worker (including the sender), which then
+delivers it to its own WebSocket subscribers (see services/events.py).
+
+    python event_broker.py --port 8300
+    EVENT_BROKER_URL=tcp://127.0.0.1:8300 uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import json
+from typing import Set
+
+writers: Set[asyncio.StreamWriter] = set()
+last_id = 0
+
+
+async def handle_worker(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    global last_id
+    peer = writer.get_extra_info("peername")
+    print(f"Worker connected: {peer}")
+    writers.add(writer)
+    try:
+        while line := await reader.readline():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                print(f"Ignoring malformed event from {peer}")
+                continue
+            last_id += 1
+            event["id"] = last_id
+            data = (json.dumps(event) + "\n").encode()
+            for target in list(writers):
+                try:
+                    target.write(data)
+                except Exception as e:
+                    print(f"Dropping worker after write failure: {e}")
+                    writers.discard(target)
+    finally:
+        writers.discard(writer)
+        writer.close()
+        print(f"Worker disconnected: {peer}")
+
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(handle_worker, host, port)
+    print(f"Event broker listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8300)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
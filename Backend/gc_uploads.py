@@ -0,0 +1,183 @@
+"""
+Deletes files in the upload directory that no inspection row references.
+
+    python gc_uploads.py --dry-run
+    python gc_uploads.py --min-age-hours 24
+
+Both sides are streamed: the directory with os.scandir, the database with yield_per. Each stream is
+sorted in chunks of --chunk-size names written to temporary run files and merged back with heapq.merge
+(an external sort), so the set difference is a single merge pass and memory stays bounded by the chunk
+size, not by the number of files. The database is sorted in Python too, since its collation may not
+match Python's string order.
+
+Files younger than --min-age-hours are never deleted: /upload writes the file before its row is
+committed, and the analysis in between can take minutes.
+"""
+import argparse
+import heapq
+import os
+import sys
+import tempfile
+import time
+from typing import Iterable, Iterator, List, Tuple
+
+import database
+import models
+
+DEFAULT_UPLOAD_DIR = "/tmp" if os.environ.get("VERCEL") else "uploads"
+
+
+def _write_run(lines: List[str], directory: str) -> str:
+    handle, path = tempfile.mkstemp(dir=directory, suffix=".run")
+    with os.fdopen(handle, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+    return path
+
+
+def external_sort(lines: Iterable[str], chunk_size: int, directory: str) -> Iterator[str]:
+    """Sorted iterator over `lines` (which must not contain newlines), holding at most chunk_size in memory."""
+    runs: List[str] = []
+    chunk: List[str] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            chunk.sort()
+            runs.append(_write_run(chunk, directory))
+            chunk = []
+    chunk.sort()
+    if not runs:
+        yield from chunk
+        return
+    if chunk:
+        runs.append(_write_run(chunk, directory))
+    del chunk
+
+    files = [open(path) for path in runs]
+    try:
+        yield from heapq.merge(*[(line.rstrip("\n") for line in f) for f in files])
+    finally:
+        for f in files:
+            f.close()
+        for path in runs:
+            os.remove(path)
+
+
+def scan_uploads(upload_dir: str, min_age_seconds: float) -> Iterator[str]:
+    """
+    "name<TAB>size<TAB>young" lines for the regular files in upload_dir. The tab sorts below every
+    printable character, so sorting the lines sorts by name.
+    """
+    cutoff = time.time() - min_age_seconds
+    with os.scandir(upload_dir) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            young = 1 if stat.st_mtime > cutoff else 0
+            yield f"{entry.name}\t{stat.st_size}\t{young}"
+
+
+def referenced_files(batch_size: int) -> Iterator[str]:
+    db = database.SessionLocal()
+    try:
+        query = db.query(models.InspectionProfile.image_path)\
+            .filter(models.InspectionProfile.image_path.isnot(None))\
+            .yield_per(batch_size)
+        for (image_path,) in query:
+            yield os.path.basename(image_path)
+    finally:
+        db.close()
+
+
+def find_orphans(files: Iterator[str], referenced: Iterator[str]) -> Iterator[Tuple[str, str, int, bool]]:
+    """
+    Merge pass over the two sorted streams. Yields ("orphan", name, size, young) for unreferenced files
+    and ("dangling", name, 0, False) for referenced names with no file.
+    """
+    current = next(referenced, None)
+    for line in files:
+        name, size, young = line.split("\t")
+        while current is not None and current < name:
+            yield "dangling", current, 0, False
+            current = next(referenced, None)
+        if current == name:
+            # Several rows may share a name; skip them all
+            while current == name:
+                current = next(referenced, None)
+            continue
+        yield "orphan", name, int(size), young == "1"
+    while current is not None:
+        yield "dangling", current, 0, False
+        current = next(referenced, None)
+
+
+def _human(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def run(args) -> int:
+    if database.SessionLocal is None:
+        print("DATABASE_URL is not set.")
+        return 2
+    if not os.path.isdir(args.upload_dir):
+        print(f"{args.upload_dir} is not a directory.")
+        return 2
+
+    started = time.perf_counter()
+    orphans = young = dangling = failed = 0
+    reclaimed = 0
+    with tempfile.TemporaryDirectory(prefix="gc_uploads_") as tmp_dir:
+        files = external_sort(scan_uploads(args.upload_dir, args.min_age_hours * 3600), args.chunk_size, tmp_dir)
+        referenced = external_sort(referenced_files(args.chunk_size), args.chunk_size, tmp_dir)
+
+        for kind, name, size, is_young in find_orphans(files, referenced):
+            if kind == "dangling":
+                dangling += 1
+                continue
+            if is_young:
+                young += 1
+                continue
+            orphans += 1
+            if args.dry_run:
+                reclaimed += size
+                if args.verbose:
+                    print(f"would delete {name} ({_human(size)})")
+                continue
+            try:
+                os.remove(os.path.join(args.upload_dir, name))
+                reclaimed += size
+                if args.verbose:
+                    print(f"deleted {name} ({_human(size)})")
+            except OSError as e:
+                failed += 1
+                print(f"Could not delete {name}: {e}")
+
+    elapsed = time.perf_counter() - started
+    verb = "would reclaim" if args.dry_run else "reclaimed"
+    print(f"{orphans} orphaned files, {verb} {_human(reclaimed)} ({reclaimed} bytes) in {elapsed:.1f}s")
+    print(f"{young} unreferenced files younger than {args.min_age_hours:g}h kept")
+    print(f"{dangling} inspection rows point at missing files")
+    if failed:
+        print(f"{failed} files could not be deleted")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--upload-dir", default=DEFAULT_UPLOAD_DIR)
+    parser.add_argument("--min-age-hours", type=float, default=24, help="Never delete files modified more recently")
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="Names held in memory per sorted run")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+    parser.add_argument("--verbose", action="store_true", help="Print every file")
+    args = parser.parse_args()
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,42 @@
+from sqlalchemy import inspect, text
+
 from database import engine, Base
-from models import InspectionProfile
+import models  # noqa: F401 - registers the tables on Base.metadata
+
+
+def add_missing_columns():
+    """
+    create_all() never alters existing tables, so add any model columns and indexes the database doesn't have yet.
+    New columns are always nullable, which keeps this safe on tables that already hold data.
+    Foreign key constraints of new columns are not added.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                print(f"Adding column {table.name}.{column.name} ({column_type})")
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                print(f"Creating index {index.name} on {table.name}")
+                index.create(connection, checkfirst=True)
+
+
+def init_db():
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
 
-print("Creating database tables...")
-Base.metadata.create_all(bind=engine)
-print("Database tables created successfully.")
+if __name__ == "__main__":
+    print("Creating database tables...")
+    init_db()
+    print("Database tables created successfully.")
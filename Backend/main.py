@@ -1,29 +1,62 @@
 import os
+import asyncio
+import json
 import shutil
+import time
 import uuid
-from typing import List
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, status, Response
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, List, Literal, Optional, Tuple
+from fastapi import FastAPI, UploadFile, File, Form, Query, Depends, HTTPException, status, Request, Response, WebSocket, WebSocketDisconnect, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import delete, func, or_
 from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
 from fastapi.staticfiles import StaticFiles
 
 
 # Import internal modules
+import database
 from database import engine, get_db
 import models
 import schemas
 from services.analysis_service import AnalysisService
-from auth import get_current_user
-from utils.pdf_generator import generate_pdf_report
+from services.concurrency import model_call_limiter, cancellation_stats
+from services.scheduler import analysis_scheduler, work_as
+from services.rate_limiter import upload_rate_limiter
+from services.packing import ImageBatcher
+from services.prescreen import Prescreener, auto_pass_result
+from services.phash import NearDuplicateIndex, phash_file, to_hex
+from services.tiling import TiledAnalyzer
+from services.video import sample_frames_in_worker, summarize_frames
+from services.events import event_bus, RESYNC
+from services.http_cache import CACHE_CONTROL, ResponseCache, etag_matches, make_etag
+from auth import get_current_user, verify_token
 
-# Initialize Database
-# Initialize Database
-try:
-    models.Base.metadata.create_all(bind=engine)
-except Exception as e:
-    print(f"Warning: Database initialization failed: {e}")
+# Schema creation is an explicit migration step (python init_db.py) so cold starts don't touch the
+# database. AUTO_MIGRATE=1 restores the old behaviour for local development.
+if os.getenv("AUTO_MIGRATE") == "1":
+    try:
+        from init_db import init_db
+        init_db()
+    except Exception as e:
+        print(f"Warning: Database initialization failed: {e}")
 
 app = FastAPI(title="Quality Control Inspector API", version="0.1.0")
+
+# Registered before CORS so its 413 still gets the CORS headers (VIDEO_MAX_BYTES is defined with the video endpoint)
+@app.middleware("http")
+async def reject_oversized_videos(request: Request, call_next):
+    """
+    Starlette spools the whole multipart body before the endpoint (or any dependency) runs, so a too-large
+    video has to be refused here, from its Content-Length, to avoid writing it to disk first.
+    """
+    if request.url.path == "/upload/video":
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > VIDEO_MAX_BYTES + VIDEO_FORM_OVERHEAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": "Video file too large"})
+    return await call_next(request)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -55,6 +88,40 @@ except Exception as e:
     print(f"Warning: AnalysisService initialization failed: {e}")
     analysis_service = None
 
+# Optional multi-image packing: concurrent uploads share one model request
+image_batcher = None
+if analysis_service and os.getenv("ANALYSIS_PACKING") == "1":
+    image_batcher = ImageBatcher.from_env(analysis_service)
+
+# Tiled analysis for high-resolution images (ANALYSIS_TILING=1 makes it the default for large uploads)
+tiled_analyzer = TiledAnalyzer.from_env(analysis_service) if analysis_service else None
+TILING_DEFAULT = os.getenv("ANALYSIS_TILING") == "1"
+
+# Optional local pre-screen that auto-passes obviously clean parts (PRESCREEN_ENABLED=1)
+prescreener = Prescreener.from_env()
+
+# Perceptual-hash index for reusing analyses of near-identical frames
+duplicate_index = None
+if os.getenv("PHASH_ENABLED", "1") == "1":
+    duplicate_index = NearDuplicateIndex(max_distance=int(os.getenv("PHASH_MAX_DISTANCE", "6")))
+# Whether /upload reuses a near-duplicate's analysis when the request doesn't say
+PHASH_REUSE_DEFAULT = os.getenv("PHASH_REUSE") == "1"
+
+# Serialized inspection responses, per user. Every published inspection event (upload, update, delete,
+# including other workers' events via the broker) drops the owner's entries and the all-users listing.
+response_cache = ResponseCache(max_entries_per_user=int(os.getenv("RESPONSE_CACHE_ENTRIES", "32")))
+ALL_USERS_SCOPE = "*"
+
+def _invalidate_cached_responses(event: dict) -> None:
+    response_cache.invalidate(event["user_id"])
+    response_cache.invalidate(ALL_USERS_SCOPE)
+
+event_bus.add_listener(_invalidate_cached_responses)
+
+@app.on_event("startup")
+async def start_event_bus():
+    await event_bus.start()
+
 @app.get("/")
 async def root():
     return {
@@ -72,40 +139,234 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Runtime metrics for the analysis pipeline.
+    """
+    return {
+        "model_limiter": model_call_limiter.metrics(),
+        "scheduler": analysis_scheduler.metrics(),
+        "cancellation": cancellation_stats.metrics(),
+        "upload_rate_limiter": upload_rate_limiter.metrics(),
+        "packing": image_batcher.metrics() if image_batcher else None,
+        "prescreen": prescreener.metrics() if prescreener else None,
+        "duplicate_index": duplicate_index.metrics() if duplicate_index else None,
+        "events": event_bus.metrics(),
+        "response_cache": response_cache.metrics(),
+    }
+
+def _save_upload(file: UploadFile):
+    """Writes the uploaded file to UPLOAD_DIR under a unique name. Returns (filename, path)."""
+    file_extension = os.path.splitext(file.filename)[1]
+    if not file_extension:
+        file_extension = ".jpg" # Default if missing
+        
+    unique_filename = f"{uuid.uuid4()}{file_extension}"
+    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+    
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+    return unique_filename, file_path
+
+def _take_upload_token(user_id: str) -> None:
+    allowed, retry_after = upload_rate_limiter.check(user_id)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Upload rate limit exceeded. Please slow down.",
+            headers={"Retry-After": str(max(1, round(retry_after)))}
+        )
+
+def enforce_upload_rate_limit(current_user_id: str = Depends(get_current_user)) -> str:
+    """
+    Dependency applying the per-user token bucket to upload endpoints.
+    Returns the user ID so it can replace get_current_user.
+    """
+    _take_upload_token(current_user_id)
+    return current_user_id
+
+def upload_priority(priority: Literal["interactive", "batch", "background"] = Form("interactive")) -> str:
+    """Dependency validating the scheduler lane of an upload (422 on an unknown lane)."""
+    return priority
+
+def enforce_prioritized_upload_rate_limit(
+    priority: str = Depends(upload_priority),
+    current_user_id: str = Depends(get_current_user),
+) -> str:
+    """
+    enforce_upload_rate_limit for endpoints taking `priority`. FastAPI still runs sibling dependencies when a
+    form field fails validation, so the token is taken here, after the priority has been validated.
+    """
+    _take_upload_token(current_user_id)
+    return current_user_id
+
+def _remove_upload_files(filenames: List[str]) -> None:
+    """Deletes files from UPLOAD_DIR, logging (not raising) failures. Run as a background task for bulk deletes."""
+    for filename in filenames:
+        file_path = os.path.join(UPLOAD_DIR, filename)
+        try:
+            os.remove(file_path)
+            print(f"Deleted file: {file_path}")
+        except FileNotFoundError:
+            print(f"File not found during deletion: {file_path}")
+        except Exception as e:
+            print(f"Error deleting file {filename}: {e}")
+
+def _record_usage(db: Session, inspection: models.InspectionProfile, usage: List[dict]) -> None:
+    """Adds one ModelUsage row per model call made for this inspection (commit is left to the caller)."""
+    for record in usage:
+        db.add(models.ModelUsage(inspection_id=inspection.id, user_id=inspection.user_id, **record))
+
+def _compute_phash(file_path: str) -> Optional[int]:
+    try:
+        return phash_file(file_path)
+    except Exception as e:
+        print(f"Could not hash {file_path}: {e}")
+        return None
+
+def _find_duplicate_result(db: Session, user_id: str, product: Optional[str], phash: int) -> Optional[dict]:
+    """Analysis result of the nearest near-duplicate inspection, marked with where it came from."""
+    match = duplicate_index.find(db, user_id, product, phash)
+    if match is None:
+        return None
+
+    inspection_id, distance = match
+    original = db.query(models.InspectionProfile).filter(models.InspectionProfile.id == inspection_id).first()
+    if original is None or original.status != "completed" or not original.analysis_result:
+        duplicate_index.discard(inspection_id)
+        return None
+
+    print(f"Reusing analysis of inspection {inspection_id} (Hamming distance {distance})")
+    result = dict(original.analysis_result)
+    result["duplicate_of"] = {"inspection_id": inspection_id, "hamming_distance": distance}
+    return result
+
+def _publish_inspection(event_type: str, inspection: models.InspectionProfile) -> None:
+    """Pushes an inspection.created/updated event to the owner's WebSocket subscribers. Expects image_url to be set."""
+    event_bus.publish(
+        inspection.user_id,
+        f"inspection.{event_type}",
+        schemas.InspectionProfile.model_validate(inspection).model_dump(mode="json")
+    )
+
+# Overall time budget of one upload's analysis, including the model fallback chain
+ANALYSIS_DEADLINE_SECONDS = float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "120"))
+DISCONNECT_POLL_SECONDS = 0.5
+
+async def _run_until_disconnect(request: Request, work: Awaitable) -> Tuple[bool, Any]:
+    """
+    Runs `work`, cancelling it (and the model calls it is waiting on) if the client disconnects first.
+    Returns (cancelled, result).
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return False, task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                return True, None
+    finally:
+        # The handler itself was cancelled
+        if not task.done():
+            task.cancel()
+
+def _sse_event(event: str, data) -> str:
+    """Formats a single Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 @app.post("/upload", response_model=schemas.InspectionProfile)
 async def upload_image(
+    request: Request,
     file: UploadFile = File(...), 
-    current_user_id: str = Depends(get_current_user),
+    product: Optional[str] = Form(None),
+    reuse_duplicates: Optional[bool] = Form(None),
+    tiled: Optional[bool] = Form(None),
+    timeout_seconds: Optional[float] = Form(None),
+    priority: str = Depends(upload_priority),
+    current_user_id: str = Depends(enforce_prioritized_upload_rate_limit),
     db: Session = Depends(get_db)
 ):
     """
     Upload an image, analyze it using Gemini Vision, and save the result.
+    `product` selects the pre-screen profile and scopes near-duplicate lookup.
+    `reuse_duplicates` copies the analysis of a near-identical earlier upload instead of calling the model
+    (defaults to the PHASH_REUSE setting).
+    `tiled` analyzes images above TILING_MIN_PIXELS as overlapping tiles (defaults to the ANALYSIS_TILING setting).
+    `timeout_seconds` bounds the analysis (defaults to ANALYSIS_DEADLINE_SECONDS); past it the inspection is saved as failed.
+    If the client disconnects mid-analysis, outstanding model calls are cancelled and the inspection is saved as cancelled.
+    `priority` is the scheduler lane of the model calls: interactive (default), batch or background.
     """
+    deadline = time.monotonic() + (timeout_seconds or ANALYSIS_DEADLINE_SECONDS)
+    file_path = None
+    saved = False
     try:
         # 1. Save file to disk
-        file_extension = os.path.splitext(file.filename)[1]
-        if not file_extension:
-            file_extension = ".jpg" # Default if missing
-            
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        unique_filename, file_path = _save_upload(file)
+
+        # 2. Near-duplicate lookup by perceptual hash
+        phash = None
+        duplicate_result = None
+        if duplicate_index:
+            phash = await asyncio.to_thread(_compute_phash, file_path)
+        if reuse_duplicates is None:
+            reuse_duplicates = PHASH_REUSE_DEFAULT
+        if phash is not None and reuse_duplicates:
+            duplicate_result = _find_duplicate_result(db, current_user_id, product, phash)
+
+        # 3. Pre-screen: obviously clean parts skip the model entirely
+        screen = None
+        if prescreener and duplicate_result is None:
+            screen = await asyncio.to_thread(prescreener.screen, file_path, product)
             
-        # 2. Analyze image
-        if not analysis_service:
+        # 4. Analyze image
+        usage = []
+        if duplicate_result is not None:
+            status_val = "completed"
+            analysis_result = duplicate_result
+        elif screen and screen["decision"] == "pass":
+            print(f"Pre-screen passed {file_path} (score {screen['score']})")
+            status_val = "completed"
+            analysis_result = auto_pass_result(screen)
+        elif not analysis_service:
             # If service failed to init (e.g. missing API key), report error
             status_val = "failed"
             analysis_result = {"error": "Analysis Service not available. Check server logs."}
         else:
             try:
                 print(f"Starting analysis for {file_path}")
-                analysis_result = await analysis_service.analyze_image(file_path)
+                if tiled is None:
+                    tiled = TILING_DEFAULT
+
+                async def run_analysis():
+                    if tiled and await asyncio.to_thread(tiled_analyzer.should_tile, file_path):
+                        return await tiled_analyzer.analyze(file_path, usage=usage, deadline=deadline)
+                    if image_batcher:
+                        return await image_batcher.analyze(file_path, usage=usage, deadline=deadline)
+                    return await analysis_service.analyze_image(file_path, usage=usage, deadline=deadline)
+
+                # The analysis task copies this context, so its model calls are queued in the requested lane
+                with work_as(priority, current_user_id):
+                    cancelled, analysis_result = await _run_until_disconnect(request, run_analysis())
+                if cancelled:
+                    print(f"Client disconnected; cancelled analysis of {file_path}")
+                    cancellation_stats.cancelled_analyses += 1
+                    analysis_result = {"error": "Cancelled: the client disconnected before the analysis finished"}
+                elif screen:
+                    analysis_result["prescreen"] = screen
                 
                 # Determine status
                 status_val = "completed"
-                if analysis_result.get("error"):
+                if cancelled:
+                    status_val = "cancelled"
+                elif analysis_result.get("error"):
                     status_val = "failed"
                     print(f"Analysis reported error: {analysis_result['error']}")
             except Exception as e:
@@ -115,27 +376,366 @@ async def upload_image(
             
 
 
-        # 3. Save to database
+        # 5. Save to database
         db_inspection = models.InspectionProfile(
             image_path=unique_filename, # Store relative path or just filename
             analysis_result=analysis_result,
             status=status_val,
-            user_id=current_user_id # Use authenticated user ID
+            user_id=current_user_id, # Use authenticated user ID
+            product=product,
+            phash=to_hex(phash) if phash is not None else None
         )
         db.add(db_inspection)
+        db.flush()
+        _record_usage(db, db_inspection, usage)
         db.commit()
+        saved = True
         db.refresh(db_inspection)
+
+        if phash is not None and status_val == "completed":
+            duplicate_index.add(current_user_id, product, phash, db_inspection.id)
         
         db_inspection.image_url = f"{BASE_URL}/uploads/{db_inspection.image_path}"
+        _publish_inspection("created", db_inspection)
         return db_inspection
 
     except Exception as e:
         print(f"Upload process error: {e}")
-        # Clean up file if database save fails? Left for future improvement
+        if file_path and not saved:
+            # No row points at the file, so nothing would ever delete it
+            _remove_upload_files([os.path.basename(file_path)])
         raise HTTPException(status_code=500, detail=str(e))
 
+def _mark_cancelled(inspection_id: int, usage: List[dict]) -> None:
+    """Records a cancelled analysis on its row, with whatever usage was already spent."""
+    cancel_db = database.SessionLocal()
+    try:
+        inspection = cancel_db.query(models.InspectionProfile).filter(models.InspectionProfile.id == inspection_id).first()
+        if inspection is None:
+            return
+        inspection.status = "cancelled"
+        inspection.analysis_result = {"error": "Cancelled: the client disconnected before the analysis finished"}
+        _record_usage(cancel_db, inspection, usage)
+        cancel_db.commit()
+        inspection.image_url = f"{BASE_URL}/uploads/{inspection.image_path}"
+        _publish_inspection("updated", inspection)
+    except Exception as e:
+        print(f"Failed to mark inspection {inspection_id} as cancelled: {e}")
+    finally:
+        cancel_db.close()
+
+@app.post("/upload/stream")
+async def upload_image_stream(
+    file: UploadFile = File(...),
+    product: Optional[str] = Form(None),
+    current_user_id: str = Depends(enforce_upload_rate_limit),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload an image and stream the analysis back as Server-Sent Events.
+
+    Events, in order:
+      - `inspection`: the pending inspection row (id, image_url)
+      - `defect`: one per defect, sent as soon as the model has finished describing it
+      - `result`: the final InspectionProfile, after it has been persisted
+    """
+    if not analysis_service:
+        raise HTTPException(status_code=503, detail="Analysis Service not available. Check server logs.")
+
+    unique_filename = None
+    saved = False
+    try:
+        unique_filename, file_path = _save_upload(file)
+        phash = await asyncio.to_thread(_compute_phash, file_path) if duplicate_index else None
+
+        # Create the row up front so the client has an id while the analysis streams
+        db_inspection = models.InspectionProfile(
+            image_path=unique_filename,
+            status="pending",
+            user_id=current_user_id,
+            product=product,
+            phash=to_hex(phash) if phash is not None else None
+        )
+        db.add(db_inspection)
+        db.commit()
+        saved = True
+        db.refresh(db_inspection)
+        inspection_id = db_inspection.id
+        db_inspection.image_url = f"{BASE_URL}/uploads/{unique_filename}"
+        _publish_inspection("created", db_inspection)
+    except Exception as e:
+        print(f"Upload process error: {e}")
+        if unique_filename and not saved:
+            # No row points at the file, so nothing would ever delete it
+            _remove_upload_files([unique_filename])
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        image_url = f"{BASE_URL}/uploads/{unique_filename}"
+        yield _sse_event("inspection", {"id": inspection_id, "status": "pending", "image_url": image_url})
+
+        screen = None
+        if prescreener:
+            screen = await asyncio.to_thread(prescreener.screen, file_path, product)
+
+        analysis_result = None
+        usage = []
+        if screen and screen["decision"] == "pass":
+            analysis_result = auto_pass_result(screen)
+        else:
+            try:
+                with work_as("interactive", current_user_id):
+                    async for kind, payload in analysis_service.stream_analyze_image(file_path, usage=usage):
+                        if kind == "defect":
+                            yield _sse_event("defect", payload)
+                        else:
+                            analysis_result = payload
+            except (asyncio.CancelledError, GeneratorExit):
+                # The client disconnected and the response was torn down; the model stream is closed with it
+                print(f"Client disconnected; cancelled streamed analysis of inspection {inspection_id}")
+                cancellation_stats.cancelled_analyses += 1
+                _mark_cancelled(inspection_id, usage)
+                raise
+            if screen:
+                analysis_result["prescreen"] = screen
+
+        status_val = "failed" if analysis_result.get("error") else "completed"
+
+        # The request-scoped session may already be closed once streaming starts, so use our own
+        stream_db = database.SessionLocal()
+        try:
+            inspection = stream_db.query(models.InspectionProfile).filter(models.InspectionProfile.id == inspection_id).first()
+            inspection.analysis_result = analysis_result
+            inspection.status = status_val
+            _record_usage(stream_db, inspection, usage)
+            stream_db.commit()
+            stream_db.refresh(inspection)
+            if phash is not None and status_val == "completed":
+                duplicate_index.add(current_user_id, product, phash, inspection_id)
+            inspection.image_url = image_url
+            _publish_inspection("updated", inspection)
+            yield _sse_event("result", schemas.InspectionProfile.model_validate(inspection).model_dump(mode="json"))
+        except Exception as e:
+            print(f"Failed to persist streamed analysis for inspection {inspection_id}: {e}")
+            yield _sse_event("error", {"id": inspection_id, "detail": str(e)})
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", str(500 * 1024 * 1024)))
+VIDEO_CHUNK_BYTES = 1024 * 1024
+# Upper bound on model calls per video upload, and the densest sampling a client may ask for
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "60"))
+VIDEO_MIN_INTERVAL_SECONDS = float(os.getenv("VIDEO_MIN_INTERVAL_SECONDS", "0.5"))
+# Room for the multipart boundaries and the other form fields around the clip
+VIDEO_FORM_OVERHEAD_BYTES = 64 * 1024
+
+@app.post("/upload/video", response_model=schemas.VideoInspection)
+async def upload_video(
+    file: UploadFile = File(...),
+    product: Optional[str] = Form(None),
+    interval_seconds: float = Form(1.0),
+    scene_threshold: float = Form(30.0),
+    max_frames: int = Form(VIDEO_MAX_FRAMES),
+    current_user_id: str = Depends(enforce_upload_rate_limit),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload an inspection video. Frames are sampled every `interval_seconds` and on scene changes,
+    near-duplicate frames are dropped, and each remaining frame is analyzed as a child inspection
+    of a parent inspection that summarizes the whole clip.
+    `max_frames` is capped at VIDEO_MAX_FRAMES and `interval_seconds` can't go below VIDEO_MIN_INTERVAL_SECONDS,
+    since one upload (one rate-limit token) costs a model call per frame.
+    """
+    if not analysis_service:
+        raise HTTPException(status_code=503, detail="Analysis Service not available. Check server logs.")
+    max_frames = max(1, min(max_frames, VIDEO_MAX_FRAMES))
+    interval_seconds = max(interval_seconds, VIDEO_MIN_INTERVAL_SECONDS)
+
+    # 1. Copy the spooled upload into UPLOAD_DIR in chunks. Bodies sent without a Content-Length (chunked)
+    # get past reject_oversized_videos, so the size limit is checked again here.
+    file_extension = os.path.splitext(file.filename)[1] or ".mp4"
+    video_filename = f"{uuid.uuid4()}{file_extension}"
+    video_path = os.path.join(UPLOAD_DIR, video_filename)
+    written = 0
+    try:
+        with open(video_path, "wb") as buffer:
+            while chunk := await file.read(VIDEO_CHUNK_BYTES):
+                written += len(chunk)
+                if written > VIDEO_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="Video file too large")
+                buffer.write(chunk)
+    except HTTPException:
+        os.remove(video_path)
+        raise
+
+    try:
+        # 2. Decode and sample frames in a worker process
+        sampling = await sample_frames_in_worker(
+            video_path,
+            UPLOAD_DIR,
+            interval_seconds=interval_seconds,
+            scene_threshold=scene_threshold,
+            dedupe_distance=duplicate_index.max_distance if duplicate_index else 6,
+            max_frames=max_frames,
+        )
+    except Exception as e:
+        print(f"Video decoding failed for {video_path}: {e}")
+        os.remove(video_path)
+        raise HTTPException(status_code=400, detail=f"Could not decode video: {e}")
+
+    frames = sampling.pop("frames")
+    print(f"Sampled {len(frames)} distinct frames from {video_path} ({sampling['duplicates_dropped']} duplicates dropped)")
+
+    parent_id = None
+    try:
+        # 3. Parent row first so children can reference it
+        parent = models.InspectionProfile(
+            image_path=video_filename,
+            status="pending",
+            user_id=current_user_id,
+            product=product
+        )
+        db.add(parent)
+        db.commit()
+        db.refresh(parent)
+        parent_id = parent.id
+        parent.image_url = f"{BASE_URL}/uploads/{parent.image_path}"
+        _publish_inspection("created", parent)
+
+        # 4. Analyze the distinct frames with bounded concurrency
+        semaphore = asyncio.Semaphore(int(os.getenv("VIDEO_ANALYSIS_CONCURRENCY", "4")))
+
+        async def analyze_frame(frame):
+            async with semaphore:
+                usage = []
+                result = await analysis_service.analyze_image(os.path.join(UPLOAD_DIR, frame["filename"]), usage=usage, user_id=current_user_id)
+                result["frame"] = {key: frame[key] for key in ("frame_index", "timestamp", "reason")}
+                return result, usage
+
+        outcomes = await asyncio.gather(*[analyze_frame(frame) for frame in frames])
+
+        children = []
+        for frame, (result, usage) in zip(frames, outcomes):
+            child = models.InspectionProfile(
+                image_path=frame["filename"],
+                analysis_result=result,
+                status="failed" if result.get("error") else "completed",
+                user_id=current_user_id,
+                product=product,
+                phash=frame["phash"],
+                parent_id=parent.id
+            )
+            db.add(child)
+            db.flush()
+            _record_usage(db, child, usage)
+            children.append(child)
+
+        # 5. Summarize the clip on the parent
+        summary = summarize_frames([result for result, _ in outcomes])
+        summary["video"] = {**sampling, "frames_analyzed": len(frames), "frame_inspection_ids": [child.id for child in children]}
+        parent.analysis_result = summary
+        parent.status = "completed" if any(child.status == "completed" for child in children) else "failed"
+        db.commit()
+        db.refresh(parent)
+
+        parent.image_url = f"{BASE_URL}/uploads/{parent.image_path}"
+        _publish_inspection("updated", parent)
+        for child in children:
+            db.refresh(child)
+            child.image_url = f"{BASE_URL}/uploads/{child.image_path}"
+
+        response = schemas.VideoInspection.model_validate(parent)
+        response.frames = [schemas.InspectionProfile.model_validate(child) for child in children]
+        return response
+
+    except Exception as e:
+        print(f"Video upload process error: {e}")
+        db.rollback()
+        # The frame rows were rolled back, so nothing references the frame files any more
+        _remove_upload_files([frame["filename"] for frame in frames])
+        if parent_id is not None:
+            _mark_video_failed(parent_id, str(e))
+        else:
+            _remove_upload_files([video_filename])
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _mark_video_failed(inspection_id: int, error: str) -> None:
+    """Moves a video inspection that was left pending by a failed upload to failed."""
+    fail_db = database.SessionLocal()
+    try:
+        inspection = fail_db.query(models.InspectionProfile).filter(models.InspectionProfile.id == inspection_id).first()
+        if inspection is None:
+            return
+        inspection.status = "failed"
+        inspection.analysis_result = {"error": f"Video analysis failed: {error}"}
+        fail_db.commit()
+        inspection.image_url = f"{BASE_URL}/uploads/{inspection.image_path}"
+        _publish_inspection("updated", inspection)
+    except Exception as e:
+        print(f"Failed to mark video inspection {inspection_id} as failed: {e}")
+    finally:
+        fail_db.close()
+
+_inspection_list_adapter = TypeAdapter(List[schemas.InspectionProfile])
+
+def _cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Authorization"}
+
+def _inspection_etag(inspection_id: int, status_val: str, updated_at, created_at) -> str:
+    return make_etag("inspection", inspection_id, status_val, updated_at or created_at)
+
+def _inspection_list_response(request: Request, db: Session, user_id: Optional[str], skip: int, limit: int) -> Response:
+    """
+    Listing shared by /my-inspections (one user) and /inspections (user_id None: everyone).
+    The list version (row count, newest id, latest change) is one aggregate query; full rows are
+    only loaded and serialized when it changed.
+    """
+    version_query = db.query(
+            func.count(models.InspectionProfile.id),
+            func.max(models.InspectionProfile.id),
+            func.max(func.coalesce(models.InspectionProfile.updated_at, models.InspectionProfile.created_at)),
+        )\
+        .filter(models.InspectionProfile.parent_id.is_(None))
+    if user_id:
+        version_query = version_query.filter(models.InspectionProfile.user_id == user_id)
+    count, newest_id, last_change = version_query.one()
+
+    etag = make_etag("list", user_id or ALL_USERS_SCOPE, skip, limit, count, newest_id, last_change)
+    headers = _cache_headers(etag)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    scope = user_id or ALL_USERS_SCOPE
+    key = f"list:{skip}:{limit}"
+    body = response_cache.get(scope, key, etag)
+    if body is None:
+        # Video frames are listed under their parent, not individually
+        query = db.query(models.InspectionProfile)\
+            .filter(models.InspectionProfile.parent_id.is_(None))
+        if user_id:
+            query = query.filter(models.InspectionProfile.user_id == user_id)
+        inspections = query.order_by(models.InspectionProfile.created_at.desc())\
+            .offset(skip).limit(limit).all()
+
+        # Dynamically compute image_url
+        for inspection in inspections:
+            inspection.image_url = f"{BASE_URL}/uploads/{inspection.image_path}"
+
+        body = _inspection_list_adapter.dump_json([schemas.InspectionProfile.model_validate(inspection) for inspection in inspections])
+        response_cache.put(scope, key, etag, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/my-inspections", response_model=List[schemas.InspectionProfile])
 def get_user_inspections(
+    request: Request,
     skip: int = 0, 
     limit: int = 100, 
     current_user_id: str = Depends(get_current_user),
@@ -143,61 +743,128 @@ def get_user_inspections(
 ):
     """
     Get a list of inspections for the currently authenticated user.
+    Supports If-None-Match; the ETag changes whenever the user's inspections do.
     """
     print(f"Fetching inspections for user: {current_user_id}")
-    inspections = db.query(models.InspectionProfile)\
-        .filter(models.InspectionProfile.user_id == current_user_id)\
-        .order_by(models.InspectionProfile.created_at.desc())\
-        .offset(skip).limit(limit).all()
-        
-    # Dynamically compute image_url
-    for inspection in inspections:
-        inspection.image_url = f"{BASE_URL}/uploads/{inspection.image_path}"
-        
-    return inspections
+    return _inspection_list_response(request, db, current_user_id, skip, limit)
+
+@app.get("/usage", response_model=List[schemas.UsageDay])
+def get_usage(
+    days: int = 30,
+    current_user_id: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Model calls and token usage of the current user, aggregated per day (newest first).
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    day = func.date(models.ModelUsage.created_at)
+    rows = db.query(
+            day.label("day"),
+            func.count(models.ModelUsage.id).label("calls"),
+            func.count(func.distinct(models.ModelUsage.inspection_id)).label("inspections"),
+            func.coalesce(func.sum(models.ModelUsage.input_tokens), 0).label("input_tokens"),
+            func.coalesce(func.sum(models.ModelUsage.output_tokens), 0).label("output_tokens"),
+            func.coalesce(func.sum(models.ModelUsage.total_tokens), 0).label("total_tokens"),
+        )\
+        .filter(models.ModelUsage.user_id == current_user_id)\
+        .filter(models.ModelUsage.created_at >= since)\
+        .group_by(day)\
+        .order_by(day.desc())\
+        .all()
+
+    return [schemas.UsageDay(**row._asdict()) for row in rows]
 
 @app.get("/inspections", response_model=List[schemas.InspectionProfile])
-def get_inspections(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_inspections(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """
     Get a list of all inspections, ordered by creation date (newest first).
+    Supports If-None-Match.
     """
-    inspections = db.query(models.InspectionProfile)\
-        .order_by(models.InspectionProfile.created_at.desc())\
-        .offset(skip).limit(limit).all()
-        
-    for inspection in inspections:
-        inspection.image_url = f"{BASE_URL}/uploads/{inspection.image_path}"
-        
-    return inspections
+    return _inspection_list_response(request, db, None, skip, limit)
+
+@app.get("/inspections/{inspection_id}/frames", response_model=List[schemas.InspectionProfile])
+def get_inspection_frames(
+    inspection_id: int,
+    db: Session = Depends(get_db),
+    current_user_id: str = Depends(get_current_user)
+):
+    """
+    Get the per-frame inspections of a video inspection, in frame order.
+    """
+    parent = db.query(models.InspectionProfile).filter(models.InspectionProfile.id == inspection_id).first()
+    if parent is None:
+        raise HTTPException(status_code=404, detail="Inspection not found")
+
+    # Verify ownership
+    if parent.user_id != current_user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this inspection")
+
+    frames = db.query(models.InspectionProfile)\
+        .filter(models.InspectionProfile.parent_id == inspection_id)\
+        .order_by(models.InspectionProfile.id)\
+        .all()
+    for frame in frames:
+        frame.image_url = f"{BASE_URL}/uploads/{frame.image_path}"
+    return frames
 
 @app.get("/inspections/{inspection_id}", response_model=schemas.InspectionProfile)
 def get_inspection(
     inspection_id: int, 
+    request: Request,
     db: Session = Depends(get_db),
     current_user_id: str = Depends(get_current_user)
 ):
     """
     Get details of a specific inspection.
+    Supports If-None-Match; the ETag changes whenever the inspection is updated.
     """
-    inspection = db.query(models.InspectionProfile).filter(models.InspectionProfile.id == inspection_id).first()
-    if inspection is None:
+    # Only the light columns: enough for the ownership check and the ETag, without the analysis JSON
+    row = db.query(
+            models.InspectionProfile.user_id,
+            models.InspectionProfile.status,
+            models.InspectionProfile.created_at,
+            models.InspectionProfile.updated_at,
+        )\
+        .filter(models.InspectionProfile.id == inspection_id)\
+        .first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Inspection not found")
         
     # Verify ownership
-    if inspection.user_id != current_user_id:
+    if row.user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this inspection")
-        
-    inspection.image_url = f"{BASE_URL}/uploads/{inspection.image_path}"
-    return inspection
+
+    etag = _inspection_etag(inspection_id, row.status, row.updated_at, row.created_at)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cache_headers(etag))
+
+    key = f"inspection:{inspection_id}"
+    body = response_cache.get(current_user_id, key, etag)
+    if body is None:
+        inspection = db.query(models.InspectionProfile).filter(models.InspectionProfile.id == inspection_id).first()
+        if inspection is None:
+            raise HTTPException(status_code=404, detail="Inspection not found")
+        # The row may have changed since the light query; tag the body with what was actually loaded
+        etag = _inspection_etag(inspection.id, inspection.status, inspection.updated_at, inspection.created_at)
+        inspection.image_url = f"{BASE_URL}/uploads/{inspection.image_path}"
+        body = schemas.InspectionProfile.model_validate(inspection).model_dump_json().encode()
+        response_cache.put(current_user_id, key, etag, body)
+
+    return Response(content=body, media_type="application/json", headers=_cache_headers(etag))
 
 @app.delete("/inspections/{inspection_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_inspection(
     inspection_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user_id: str = Depends(get_current_user)
 ):
     """
     Delete a specific inspection and its associated image file.
+    Deleting a video inspection also deletes its per-frame inspections.
+    Files are removed after the response has been sent.
     """
     inspection = db.query(models.InspectionProfile).filter(models.InspectionProfile.id == inspection_id).first()
     
@@ -208,24 +875,74 @@ def delete_inspection(
     if inspection.user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this inspection")
     
-    # Delete image file
-    try:
-        file_path = os.path.join(UPLOAD_DIR, inspection.image_path)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            print(f"Deleted file: {file_path}")
-        else:
-            print(f"File not found during deletion: {file_path}")
-    except Exception as e:
-        print(f"Error deleting file {inspection.image_path}: {e}")
-        # Continue to delete DB record even if file deletion fails, or maybe we should raise? 
-        # Usually it's better to clean up the DB even if file system is slightly out of sync or file was already gone.
+    children_query = db.query(models.InspectionProfile).filter(models.InspectionProfile.parent_id == inspection_id)
+    children = children_query.all()
+    filenames = [target.image_path for target in [inspection] + children]
+    # Read before the commit: the bulk delete leaves the children in the session, and once the
+    # commit expires them their attributes can't be reloaded
+    ids = [inspection.id] + [child.id for child in children]
     
+    # Frames first, in their own statement: in a single flush SQLAlchemy would order the DELETEs by
+    # primary key and remove the parent before the rows that reference it
+    children_query.delete(synchronize_session=False)
+    db.flush()
     db.delete(inspection)
     db.commit()
+
+    # Files go after the rows: a failed commit leaves both in place, a failed file removal only
+    # leaves an orphan for gc_uploads.py
+    background_tasks.add_task(_remove_upload_files, filenames)
+
+    if duplicate_index:
+        for target_id in ids:
+            duplicate_index.discard(target_id)
+
+    event_bus.publish(current_user_id, "inspection.deleted", {"id": inspection_id})
     
     return None
 
+BULK_DELETE_MAX_IDS = int(os.getenv("BULK_DELETE_MAX_IDS", "1000"))
+
+@app.delete("/inspections", response_model=schemas.BulkDeleteResult)
+def delete_inspections(
+    payload: schemas.BulkDeleteRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user_id: str = Depends(get_current_user)
+):
+    """
+    Delete several of the current user's inspections (and the frames of any video inspections among them)
+    in a single statement. Image files are removed after the response has been sent.
+    Ids that don't exist or belong to another user are reported in `not_found`.
+    """
+    ids = sorted(set(payload.ids))
+    if not ids:
+        return schemas.BulkDeleteResult(deleted=[], not_found=[])
+    if len(ids) > BULK_DELETE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_DELETE_MAX_IDS} ids per request")
+
+    # Ownership is part of the WHERE clause; RETURNING gives us the files without a separate SELECT
+    statement = delete(models.InspectionProfile)\
+        .where(models.InspectionProfile.user_id == current_user_id)\
+        .where(or_(models.InspectionProfile.id.in_(ids), models.InspectionProfile.parent_id.in_(ids)))\
+        .returning(models.InspectionProfile.id, models.InspectionProfile.image_path, models.InspectionProfile.parent_id)
+    rows = db.execute(statement).all()
+    db.commit()
+
+    background_tasks.add_task(_remove_upload_files, [row.image_path for row in rows])
+
+    if duplicate_index:
+        for row in rows:
+            duplicate_index.discard(row.id)
+
+    requested = set(ids)
+    deleted = sorted(row.id for row in rows if row.id in requested)
+    for inspection_id in deleted:
+        event_bus.publish(current_user_id, "inspection.deleted", {"id": inspection_id})
+
+    print(f"Bulk delete for {current_user_id}: {len(deleted)} inspections, {len(rows)} rows")
+    return schemas.BulkDeleteResult(deleted=deleted, not_found=sorted(requested - set(deleted)))
+
 @app.get("/inspections/{inspection_id}/export")
 def export_inspection(
     inspection_id: int,
@@ -243,6 +960,8 @@ def export_inspection(
     if inspection.user_id != current_user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this inspection")
 
+    # ReportLab is only needed here, so it's imported on first export rather than at startup
+    from utils.pdf_generator import generate_pdf_report
     pdf_content = generate_pdf_report(inspection)
     
     filename = f"inspection_report_{inspection_id}.pdf"
@@ -253,6 +972,57 @@ def export_inspection(
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
+EVENT_HEARTBEAT_SECONDS = 25
+# How long a new socket has to send its auth message
+EVENT_AUTH_TIMEOUT_SECONDS = 10
+
+@app.websocket("/ws/inspections")
+async def inspection_events(
+    websocket: WebSocket,
+    last_event_id: Optional[int] = Query(None)
+):
+    """
+    Pushes the user's inspection.created / inspection.updated / inspection.deleted events.
+
+    Browsers can't set headers on WebSocket requests, and a token in the URL would end up in access logs,
+    so the client's first message must be `{"type": "auth", "token": "<Firebase ID token>"}`.
+    Reconnecting clients pass the `id` of the last event they received as `last_event_id` to get what they missed;
+    a `resync` message means the gap can't be replayed and the client should refetch /my-inspections.
+    A `heartbeat` message is sent when the connection has been idle for a while.
+    """
+    await websocket.accept()
+    try:
+        message = await asyncio.wait_for(websocket.receive_json(), timeout=EVENT_AUTH_TIMEOUT_SECONDS)
+        if not isinstance(message, dict) or message.get("type") != "auth" or not message.get("token"):
+            raise ValueError("expected an auth message")
+        current_user_id = verify_token(message["token"])
+    except WebSocketDisconnect:
+        return
+    except (asyncio.TimeoutError, ValueError, HTTPException):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    subscription = event_bus.subscribe(current_user_id, last_event_id)
+
+    async def forward_events():
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                event = {"type": "heartbeat"}
+            if event is not RESYNC and event.get("user_id"):
+                event = {key: value for key, value in event.items() if key != "user_id"}
+            await websocket.send_json(event)
+
+    sender = asyncio.create_task(forward_events())
+    try:
+        # Nothing is expected from the client; reading just notices when it goes away
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+        event_bus.unsubscribe(subscription)
+
 # Legacy endpoint from template
 @app.get("/api/random-quote")
 async def get_random_quote():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Float, ForeignKey
 from sqlalchemy.sql import func
 from database import Base
 
@@ -10,13 +10,52 @@ class InspectionProfile(Base):
     
     # Store the full analysis output: defects, severity breakdown, quality issues, recommendations
     analysis_result = Column(JSON, nullable=True)
+
+    # Result before the last bulk re-analysis (reanalyze.py), kept for comparison
+    previous_analysis_result = Column(JSON, nullable=True)
     
     # Status of the inspection: 'pending', 'completed', 'failed'
     status = Column(String, default="pending")
     
     # User reference
     user_id = Column(String, nullable=True)
+
+    # Product / part type, used to pick the pre-screen profile
+    product = Column(String, nullable=True, index=True)
+
+    # 64-bit perceptual hash of the image (16 hex chars), for near-duplicate reuse
+    phash = Column(String(16), nullable=True, index=True)
+
+    # Per-frame inspections of a video point at the video's parent inspection
+    parent_id = Column(Integer, ForeignKey("inspection_profiles.id"), nullable=True, index=True)
     
     # Timestamp
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class ModelUsage(Base):
+    """One row per successful model call, taken from the response's usage_metadata."""
+    __tablename__ = "model_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Not a foreign key: usage must survive the inspection being deleted
+    inspection_id = Column(Integer, nullable=True, index=True)
+    user_id = Column(String, nullable=True, index=True)
+    model_name = Column(String, nullable=False)
+
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class RateLimitBucket(Base):
+    """Shared token-bucket state for RATE_LIMIT_BACKEND=database."""
+    __tablename__ = "rate_limit_buckets"
+
+    user_id = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    # Unix timestamp of the last refill
+    updated = Column(Float, nullable=False)
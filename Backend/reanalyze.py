@@ -0,0 +1,307 @@
+"""
+Re-runs the analysis over stored inspections, e.g. after a prompt or model list change.
+
+    python reanalyze.py --status completed --since 2026-01-01 --concurrency 4 --rate 30
+    python reanalyze.py --ids 12,13,14 --dry-run
+
+Rows are processed in id order, in chunks of --batch-size. Each chunk is written with one bulk update
+and then recorded in the checkpoint file, so after a crash the same command resumes after the last
+committed chunk (--restart discards the checkpoint). The chunk is noted in the checkpoint before it is
+written, so a crash between the write and the checkpoint doesn't re-analyze it. The old result is kept in previous_analysis_result.
+Rows whose re-analysis fails keep their current result. Prints throughput and a summary of how
+overall severities changed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import database
+import models
+from services.analysis_service import AnalysisService
+from services.rate_limiter import TokenBucket
+from services.scheduler import work_as
+
+UPLOAD_DIR = "/tmp" if os.environ.get("VERCEL") else "uploads"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".gif")
+SEVERITY_ORDER = ["unknown", "none", "low", "medium", "high", "critical"]
+
+
+class RateLimitedAnalysisService(AnalysisService):
+    """Takes a token from `bucket` before every model call, so fallback attempts count against --rate too."""
+
+    def __init__(self, bucket: TokenBucket):
+        super().__init__()
+        self.bucket = bucket
+
+    async def _try_analyze_with_model(self, *args, **kwargs) -> str:
+        await self.bucket.wait()
+        return await super()._try_analyze_with_model(*args, **kwargs)
+
+
+def _filters(args) -> Dict[str, Any]:
+    """The selection, as stored in the checkpoint; resuming with different filters is refused."""
+    return {
+        "user": args.user,
+        "status": sorted(args.status) if args.status else None,
+        "product": args.product,
+        "since": args.since,
+        "until": args.until,
+        "ids": sorted(args.ids) if args.ids else None,
+    }
+
+
+def _query(db, filters: Dict[str, Any]):
+    query = db.query(
+            models.InspectionProfile.id,
+            models.InspectionProfile.user_id,
+            models.InspectionProfile.image_path,
+            models.InspectionProfile.analysis_result,
+        )\
+        .filter(models.InspectionProfile.analysis_result.isnot(None))
+    if filters["user"]:
+        query = query.filter(models.InspectionProfile.user_id == filters["user"])
+    if filters["status"]:
+        query = query.filter(models.InspectionProfile.status.in_(filters["status"]))
+    if filters["product"]:
+        query = query.filter(models.InspectionProfile.product == filters["product"])
+    if filters["since"]:
+        query = query.filter(models.InspectionProfile.created_at >= datetime.fromisoformat(filters["since"]))
+    if filters["until"]:
+        query = query.filter(models.InspectionProfile.created_at < datetime.fromisoformat(filters["until"]))
+    if filters["ids"]:
+        query = query.filter(models.InspectionProfile.id.in_(filters["ids"]))
+    return query
+
+
+def _severity(result: Optional[Dict[str, Any]]) -> str:
+    value = str((result or {}).get("overall_severity") or "unknown").strip().lower()
+    return value if value in SEVERITY_ORDER else "unknown"
+
+
+def _load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _new_checkpoint(filters: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "run_id": uuid.uuid4().hex,
+        "filters": filters,
+        "last_id": 0,
+        "stats": {"processed": 0, "updated": 0, "failed": 0, "skipped": 0, "tokens": 0},
+        "transitions": {},
+    }
+
+
+async def _analyze_row(service: AnalysisService, semaphore: asyncio.Semaphore, row) -> Dict[str, Any]:
+    image_path = os.path.join(UPLOAD_DIR, row.image_path)
+    if not row.image_path.lower().endswith(IMAGE_EXTENSIONS) or not os.path.exists(image_path):
+        # Video parents and rows whose file is gone
+        return {"row": row, "skipped": True}
+    async with semaphore:
+        usage: List[Dict[str, Any]] = []
+        result = await service.analyze_image(image_path, usage=usage, user_id=row.user_id)
+        return {"row": row, "skipped": False, "result": result, "usage": usage}
+
+
+def _summarize_chunk(outcomes: List[Dict[str, Any]], last_id: int) -> Dict[str, Any]:
+    """The chunk's contribution to the checkpoint, plus one rewritten row to tell later whether it was committed."""
+    stats: Counter = Counter()
+    transitions: Counter = Counter()
+    probe = None
+    for outcome in outcomes:
+        stats["processed"] += 1
+        if outcome["skipped"]:
+            stats["skipped"] += 1
+        elif outcome["result"].get("error"):
+            stats["failed"] += 1
+            print(f"  #{outcome['row'].id}: {outcome['result']['error']}")
+        else:
+            stats["updated"] += 1
+            stats["tokens"] += sum(record["total_tokens"] for record in outcome["usage"])
+            transitions[f"{_severity(outcome['row'].analysis_result)} -> {_severity(outcome['result'])}"] += 1
+            probe = probe or {"id": outcome["row"].id, "result": outcome["result"]}
+    return {"last_id": last_id, "stats": dict(stats), "transitions": dict(transitions), "probe": probe}
+
+
+def _apply_chunk(checkpoint: Dict[str, Any], chunk: Dict[str, Any]) -> None:
+    checkpoint["last_id"] = chunk["last_id"]
+    for key, value in chunk["stats"].items():
+        checkpoint["stats"][key] += value
+    transitions = Counter(checkpoint["transitions"])
+    transitions.update(chunk["transitions"])
+    checkpoint["transitions"] = dict(transitions)
+    checkpoint.pop("pending", None)
+
+
+def _was_committed(chunk: Dict[str, Any]) -> bool:
+    """The chunk is written in one transaction, so its probe row shows whether all of it was committed."""
+    probe = chunk["probe"]
+    if probe is None:
+        return False
+    db = database.SessionLocal()
+    try:
+        row = db.query(models.InspectionProfile.analysis_result)\
+            .filter(models.InspectionProfile.id == probe["id"])\
+            .first()
+    finally:
+        db.close()
+    return row is not None and row.analysis_result == probe["result"]
+
+
+def _write_chunk(outcomes: List[Dict[str, Any]]) -> None:
+    """One bulk update for the chunk's inspections plus one bulk insert for its model usage."""
+    updates, usage_rows = [], []
+    for outcome in outcomes:
+        if outcome["skipped"] or outcome["result"].get("error"):
+            continue
+        row = outcome["row"]
+        updates.append({
+            "id": row.id,
+            "analysis_result": outcome["result"],
+            "previous_analysis_result": row.analysis_result,
+            "status": "completed",
+        })
+        for record in outcome["usage"]:
+            usage_rows.append({"inspection_id": row.id, "user_id": row.user_id, **record})
+
+    db = database.SessionLocal()
+    try:
+        if updates:
+            db.bulk_update_mappings(models.InspectionProfile, updates)
+        if usage_rows:
+            db.bulk_insert_mappings(models.ModelUsage, usage_rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run(args) -> int:
+    if database.SessionLocal is None:
+        print("DATABASE_URL is not set.")
+        return 2
+
+    filters = _filters(args)
+    checkpoint = None if args.restart else _load_checkpoint(args.checkpoint)
+    if checkpoint and checkpoint["filters"] != filters:
+        print(f"{args.checkpoint} belongs to a run with different filters; pass --restart to discard it.")
+        return 2
+    if checkpoint and checkpoint.get("pending"):
+        # Crashed between writing a chunk and checkpointing it
+        if _was_committed(checkpoint["pending"]):
+            _apply_chunk(checkpoint, checkpoint["pending"])
+        else:
+            checkpoint.pop("pending")
+        _save_checkpoint(args.checkpoint, checkpoint)
+    if checkpoint:
+        print(f"Resuming run {checkpoint['run_id']} after inspection {checkpoint['last_id']}")
+    else:
+        checkpoint = _new_checkpoint(filters)
+
+    db = database.SessionLocal()
+    try:
+        remaining = _query(db, filters).filter(models.InspectionProfile.id > checkpoint["last_id"]).count()
+    finally:
+        db.close()
+    if args.limit:
+        remaining = min(remaining, args.limit)
+    print(f"{remaining} inspections to re-analyze")
+    if args.dry_run or not remaining:
+        return 0
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    service = RateLimitedAnalysisService(TokenBucket(rate=args.rate / 60.0, capacity=args.concurrency))
+
+    started = time.perf_counter()
+    done_this_session = 0
+    while done_this_session < remaining:
+        db = database.SessionLocal()
+        try:
+            rows = _query(db, filters)\
+                .filter(models.InspectionProfile.id > checkpoint["last_id"])\
+                .order_by(models.InspectionProfile.id)\
+                .limit(min(args.batch_size, remaining - done_this_session))\
+                .all()
+        finally:
+            db.close()
+        if not rows:
+            break
+
+        with work_as(args.priority):
+            outcomes = await asyncio.gather(*[_analyze_row(service, semaphore, row) for row in rows])
+        chunk = _summarize_chunk(outcomes, rows[-1].id)
+        checkpoint["pending"] = chunk
+        _save_checkpoint(args.checkpoint, checkpoint)
+        _write_chunk(outcomes)
+        _apply_chunk(checkpoint, chunk)
+        _save_checkpoint(args.checkpoint, checkpoint)
+
+        done_this_session += len(rows)
+        elapsed = time.perf_counter() - started
+        print(f"  {done_this_session}/{remaining} (up to id {rows[-1].id}), {done_this_session / elapsed:.2f} inspections/s")
+
+    elapsed = time.perf_counter() - started
+    _report(checkpoint["stats"], Counter(checkpoint["transitions"]), done_this_session, elapsed)
+    if done_this_session >= remaining and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    return 0
+
+
+def _report(stats: Dict[str, int], transitions: Counter, session_count: int, elapsed: float) -> None:
+    print(f"\nThis session: {session_count} inspections in {elapsed:.1f}s ({session_count / max(elapsed, 1e-9):.2f}/s)")
+    print(f"Whole run: {stats['updated']} updated, {stats['failed']} failed, {stats['skipped']} skipped, {stats['tokens']} tokens")
+
+    raised = lowered = unchanged = 0
+    for transition, count in transitions.items():
+        before, after = transition.split(" -> ")
+        change = SEVERITY_ORDER.index(after) - SEVERITY_ORDER.index(before)
+        if change > 0:
+            raised += count
+        elif change < 0:
+            lowered += count
+        else:
+            unchanged += count
+    print(f"Overall severity: {raised} raised, {lowered} lowered, {unchanged} unchanged")
+    for transition, count in sorted(transitions.items(), key=lambda item: -item[1]):
+        print(f"  {transition:<22} {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="Only this user's inspections")
+    parser.add_argument("--status", action="append", help="Only inspections with this status (repeatable)")
+    parser.add_argument("--product")
+    parser.add_argument("--since", help="Created at or after (ISO date/time)")
+    parser.add_argument("--until", help="Created before (ISO date/time)")
+    parser.add_argument("--ids", type=lambda value: [int(part) for part in value.split(",") if part], help="Comma-separated inspection ids")
+    parser.add_argument("--limit", type=int, help="Stop after this many inspections")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=30, help="Model requests per minute, fallback attempts included")
+    parser.add_argument("--priority", choices=["batch", "background"], default="batch", help="Scheduler lane of the model calls")
+    parser.add_argument("--batch-size", type=int, default=50, help="Inspections per DB write and checkpoint")
+    parser.add_argument("--checkpoint", default="reanalyze.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the matching inspections")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
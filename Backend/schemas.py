@@ -1,12 +1,16 @@
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, date
 
 class InspectionProfileBase(BaseModel):
     image_path: str
     status: str
     user_id: Optional[str] = None
+    product: Optional[str] = None
+    phash: Optional[str] = None
+    parent_id: Optional[int] = None
     analysis_result: Optional[Dict[str, Any]] = None
+    previous_analysis_result: Optional[Dict[str, Any]] = None
 
 class InspectionProfileCreate(InspectionProfileBase):
     pass
@@ -19,3 +23,21 @@ class InspectionProfile(InspectionProfileBase):
 
     class Config:
         from_attributes = True # Updated for Pydantic V2
+
+class VideoInspection(InspectionProfile):
+    frames: List[InspectionProfile] = []
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int]
+
+class BulkDeleteResult(BaseModel):
+    deleted: List[int]
+    not_found: List[int]
+
+class UsageDay(BaseModel):
+    day: date
+    calls: int
+    inspections: int
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
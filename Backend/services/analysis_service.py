@@ -1,19 +1,95 @@
 import os
+import asyncio
 import json
 import base64
 import mimetypes
 import re
-from typing import Dict, Any, List
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
+from typing import TYPE_CHECKING, Dict, Any, List, AsyncIterator, Tuple, Optional
 from dotenv import load_dotenv
 
+from services.concurrency import model_call_limiter, cancellation_stats, remaining_seconds, DeadlineExceeded, LimiterQueueTimeout
+from services.scheduler import analysis_scheduler, work_as
+from utils.partial_json import DefectStreamParser
+
+if TYPE_CHECKING:
+    from langchain_core.messages import HumanMessage
+
 load_dotenv(override=True)
 
+def usage_record(model_name: str, usage_metadata: Any) -> Optional[Dict[str, Any]]:
+    """Normalizes LangChain usage_metadata into a row for models.ModelUsage."""
+    # LangChain's UsageMetadata is a TypedDict
+    if not isinstance(usage_metadata, dict):
+        return None
+    input_tokens = int(usage_metadata.get("input_tokens") or 0)
+    output_tokens = int(usage_metadata.get("output_tokens") or 0)
+    return {
+        "model_name": model_name,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": int(usage_metadata.get("total_tokens") or 0) or input_tokens + output_tokens,
+    }
+
+def _human_message(content: List[Dict[str, Any]]) -> "HumanMessage":
+    from langchain_core.messages import HumanMessage
+    return HumanMessage(content=content)
+
+# Shared by the single-image and packed (multi-image) prompts
+DEFECT_CRITERIA = """
+        Look for ANY and ALL potential defects, including but not limited to:
+        - Surface scratches, dents, chips, or cracks
+        - Discoloration, stains, or rust
+        - Misalignment, deformation, or structural irregularities
+        - Foreign particles, dust, or contamination
+        - Poor finish, rough edges, or coating issues
+        
+        Even if the defect is minor, list it. Do NOT default to "No Defects" unless the product is truly perfect.
+"""
+
+# Per-image result schema, also used inside the packed "results" array
+ANALYSIS_JSON_FORMAT = """
+        {
+            "defects": [
+                {"name": "Defect Name", "description": "Detailed description of the defect", "location": "Specific location on object"}
+            ],
+            "severity_breakdown": {
+                "critical": 0,
+                "high": 0,
+                "medium": 0,
+                "low": 0
+            },
+            "overall_severity": "Critical/High/Medium/Low",
+            "quality_issues": ["List of general quality issues found"],
+            "recommendations": ["List of actionable recommendations"]
+        }
+"""
+
+INSPECTION_PROMPT = """
+        You are an expert Quality Control Inspector for manufacturing. 
+        Analyze this image of a manufactured product with extreme scrutiny. 
+""" + DEFECT_CRITERIA + """
+        Provide a detailed analysis in the following JSON format:
+""" + ANALYSIS_JSON_FORMAT + """
+        IMPORTANT: Return ONLY the JSON string. No markdown formatting.
+        """
+
+PACKED_INSPECTION_PROMPT = """
+        You are an expert Quality Control Inspector for manufacturing. 
+        You will receive {count} images, labelled "Image 0" to "Image {last}". Each shows a separate manufactured product.
+        Analyze EACH image independently with extreme scrutiny, applying the same criteria to every image. 
+""" + DEFECT_CRITERIA + """
+        Return a JSON object of the form {{"results": [...]}} with exactly one entry per image, in image order.
+        Each entry must contain "image_index" (the image number) plus the following fields:
+""" + ANALYSIS_JSON_FORMAT.replace("{", "{{").replace("}", "}}") + """
+        IMPORTANT: Return ONLY the JSON string. No markdown formatting.
+        """
+
 class AnalysisService:
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
+        # Local stand-in for the Gemini API (see stub_server.py), used for latency/load testing
+        self.stub_url = os.getenv("ANALYSIS_STUB_URL")
+        if not self.api_key and not self.stub_url:
             raise ValueError("GOOGLE_API_KEY not found in environment variables")
         
         # Default client setup (can be reused if needed)
@@ -28,18 +104,31 @@ class AnalysisService:
             "gemini-2.5-flash", # Added based on availability
         ]
 
-    async def _try_analyze_with_model(self, model_name: str, message: HumanMessage) -> str:
-        """Helper to try analysis with a specific model."""
+    async def _try_analyze_with_model(self, model_name: str, message: "HumanMessage", usage: Optional[List[Dict[str, Any]]] = None, deadline: Optional[float] = None) -> str:
+        """
+        Helper to try analysis with a specific model.
+        If `usage` is given, the call's token usage is appended to it.
+        `deadline` (time.monotonic()) bounds the queue wait plus the call; past it, DeadlineExceeded is raised.
+        """
         print(f"Aligning with model: {model_name}...")
         try:
             # Create a localized LLM for this attempt
-            llm = ChatGoogleGenerativeAI(
-                model=model_name,
-                google_api_key=self.api_key,
-                temperature=0.2,
-                max_retries=0, 
-            )
-            response = await llm.ainvoke([message])
+            llm = self._create_llm(model_name)
+
+            async def call():
+                # Every outbound call waits for its priority lane, then goes through the adaptive limiter
+                async with analysis_scheduler.slot(), model_call_limiter.slot():
+                    return await llm.ainvoke([message])
+
+            try:
+                response = await asyncio.wait_for(call(), timeout=remaining_seconds(deadline))
+            except asyncio.TimeoutError:
+                cancellation_stats.model_calls_cancelled += 1
+                raise DeadlineExceeded(f"Model {model_name} did not answer before the deadline") from None
+            except asyncio.CancelledError:
+                # The request went away; the slot is released by the limiter
+                cancellation_stats.model_calls_cancelled += 1
+                raise
             
             # Additional safety: handle if response itself is a list (unlikely but possible with some configurations)
             if isinstance(response, list):
@@ -53,10 +142,13 @@ class AnalysisService:
                  raise ValueError(f"Model response {type(response)} has no 'content' attribute")
 
             
-            # Debugging: Print usage metadata if available
+            # Record usage metadata if available
             try:
                 if hasattr(response, 'usage_metadata'):
                      print(f"Token usage: {response.usage_metadata}")
+                     record = usage_record(model_name, response.usage_metadata)
+                     if record and usage is not None:
+                         usage.append(record)
             except Exception:
                 pass
             
@@ -69,22 +161,69 @@ class AnalysisService:
                 content = str(response)
             if isinstance(content, list):
                 print(f"Warning: Model {model_name} returned LIST content. Joining...")
-                # It might be a list of strings or list of dicts/objects
-                text_parts = []
-                for part in content:
-                    if isinstance(part, str):
-                        text_parts.append(part)
-                    elif hasattr(part, 'text'):
-                        text_parts.append(part.text)
-                    else:
-                        text_parts.append(str(part))
-                return "".join(text_parts)
                 
-            return str(content)
+            return self._content_to_text(content)
         except Exception as e:
             # Re-raise to be caught by caller
             raise e
 
+    def _create_llm(self, model_name: str):
+        """Builds the chat client for a single model attempt."""
+        if self.stub_url:
+            from services.stub_model import StubChatModel
+            return StubChatModel(model=model_name, base_url=self.stub_url)
+
+        # Imported on first analysis; the LangChain/Gemini stack dominates cold-start time
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model=model_name,
+            google_api_key=self.api_key,
+            temperature=0.2,
+            max_retries=0, 
+        )
+
+    @staticmethod
+    def _content_to_text(content: Any) -> str:
+        """Flattens message content, which may be a list of multimodal parts, into a string."""
+        if isinstance(content, list):
+            # It might be a list of strings or list of dicts/objects
+            text_parts = []
+            for part in content:
+                if isinstance(part, str):
+                    text_parts.append(part)
+                elif isinstance(part, dict) and "text" in part:
+                    text_parts.append(str(part["text"]))
+                elif hasattr(part, 'text'):
+                    text_parts.append(part.text)
+                else:
+                    text_parts.append(str(part))
+            return "".join(text_parts)
+        return str(content)
+
+    async def _stream_with_model(self, model_name: str, message: "HumanMessage", usage: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+        """Streams raw text chunks from a specific model."""
+        print(f"Streaming with model: {model_name}...")
+        llm = self._create_llm(model_name)
+        last_usage = None
+        try:
+            async with analysis_scheduler.slot(), model_call_limiter.slot():
+                async for chunk in llm.astream([message]):
+                    # Usage arrives cumulatively on the final chunk(s)
+                    if getattr(chunk, 'usage_metadata', None):
+                        last_usage = chunk.usage_metadata
+                    text = self._content_to_text(chunk.content)
+                    if text:
+                        yield text
+        except (asyncio.CancelledError, GeneratorExit):
+            cancellation_stats.model_calls_cancelled += 1
+            raise
+
+        if last_usage:
+            print(f"Token usage: {last_usage}")
+            record = usage_record(model_name, last_usage)
+            if record and usage is not None:
+                usage.append(record)
+
     def _sanitize_json_string(self, json_str: str) -> str:
         """
         Cleans the string to ensure it's valid JSON.
@@ -154,11 +293,8 @@ class AnalysisService:
 
         return data
 
-    async def analyze_image(self, image_path: str) -> Dict[str, Any]:
-        """
-        Analyzes the image using Gemini Vision to identify defects, severity, quality issues, and recommendations.
-        Returns a structured dictionary ready for database storage.
-        """
+    def _image_part(self, image_path: str) -> Dict[str, Any]:
+        """Reads the image from disk as an inline image_url message part."""
         # Determine mime type
         mime_type, _ = mimetypes.guess_type(image_path)
         if not mime_type:
@@ -166,138 +302,288 @@ class AnalysisService:
             
         print(f"Analyzing image: {image_path} with mime type: {mime_type}")
 
-        prompt = """
-        You are an expert Quality Control Inspector for manufacturing. 
-        Analyze this image of a manufactured product with extreme scrutiny. 
-        Look for ANY and ALL potential defects, including but not limited to:
-        - Surface scratches, dents, chips, or cracks
-        - Discoloration, stains, or rust
-        - Misalignment, deformation, or structural irregularities
-        - Foreign particles, dust, or contamination
-        - Poor finish, rough edges, or coating issues
+        with open(image_path, "rb") as image_file:
+            image_data = image_file.read()
+
+        return self._inline_image_part(image_data, mime_type)
+
+    def _inline_image_part(self, image_data: bytes, mime_type: str) -> Dict[str, Any]:
+        image_b64 = base64.b64encode(image_data).decode("utf-8")
+        return {
+            "type": "image_url", 
+            "image_url": f"data:{mime_type};base64,{image_b64}"
+        }
+
+    def _build_message(self, image_path: str) -> "HumanMessage":
+        """Wraps a single image with the inspection prompt."""
+        # Construct message with proper structure for LangChain Google integration
+        return _human_message([
+            {"type": "text", "text": INSPECTION_PROMPT},
+            self._image_part(image_path)
+        ])
+
+    def _build_packed_message(self, image_paths: List[str]) -> "HumanMessage":
+        """One message carrying several labelled images and a single copy of the prompt."""
+        content = [{
+            "type": "text",
+            "text": PACKED_INSPECTION_PROMPT.format(count=len(image_paths), last=len(image_paths) - 1)
+        }]
+        for index, image_path in enumerate(image_paths):
+            content.append({"type": "text", "text": f"Image {index}:"})
+            content.append(self._image_part(image_path))
+        return _human_message(content)
+
+    def _write_debug_response(self, content: str) -> None:
+        """Saves the raw model response to a file (local only)."""
+        if not os.environ.get("VERCEL"):
+            try:
+                with open("debug_response.txt", "w", encoding="utf-8") as f:
+                    f.write(content)
+            except Exception as e:
+                print(f"Failed to write debug file: {e}")
+
+    def _parse_content(self, content: str) -> Dict[str, Any]:
+        """
+        Turns raw model output into the structured analysis dictionary.
+        Raises json.JSONDecodeError if the output cannot be parsed.
+        """
+        # 1. Sanitize the string
+        json_str = self._sanitize_json_string(content.strip())
         
-        Even if the defect is minor, list it. Do NOT default to "No Defects" unless the product is truly perfect.
+        # 2. Parse JSON
+        try:
+            data = json.loads(json_str)
+        except json.JSONDecodeError:
+            # Fallback: Try ast.literal_eval for single-quoted Python dicts
+            import ast
+            try:
+                print("JSON load failed. Trying ast.literal_eval...")
+                data = ast.literal_eval(json_str)
+            except (ValueError, SyntaxError) as e:
+                print(f"Parsing failed completely. Error: {e}")
+                raise json.JSONDecodeError("Failed to parse JSON or Python dict", json_str, 0)
         
-        Provide a detailed analysis in the following JSON format:
-        {
-            "defects": [
-                {"name": "Defect Name", "description": "Detailed description of the defect", "location": "Specific location on object"}
-            ],
-            "severity_breakdown": {
-                "critical": 0,
-                "high": 0,
-                "medium": 0,
-                "low": 0
-            },
-            "overall_severity": "Critical/High/Medium/Low",
-            "quality_issues": ["List of general quality issues found"],
-            "recommendations": ["List of actionable recommendations"]
+        # 3. Validate and Structure Data
+        return self._validate_and_fix_structure(data)
+
+    def _parse_packed_content(self, content: str, count: int) -> List[Optional[Dict[str, Any]]]:
+        """
+        Splits a packed answer into per-image results, in input order.
+        Entries that are missing or malformed come back as None so the caller can retry them alone.
+        """
+        json_str = self._sanitize_json_string(content.strip())
+        try:
+            data = json.loads(json_str)
+        except json.JSONDecodeError:
+            import ast
+            try:
+                data = ast.literal_eval(json_str)
+            except (ValueError, SyntaxError):
+                print("Packed response could not be parsed.")
+                return [None] * count
+
+        entries = data.get("results") if isinstance(data, dict) else data
+        if not isinstance(entries, list):
+            return [None] * count
+
+        results: List[Optional[Dict[str, Any]]] = [None] * count
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            index = entry.pop("image_index", position)
+            if not isinstance(index, int) or not 0 <= index < count or results[index] is not None:
+                continue
+            results[index] = self._validate_and_fix_structure(entry)
+        return results
+
+    def _parse_error_result(self, error: Exception, content: str) -> Dict[str, Any]:
+        """Result returned when the model answered but the answer could not be parsed."""
+        print(f"Parsing Error: {error}")
+        print(f"Failed Content (First 500 chars): {content[:500] if content else 'None'}")
+        return {
+            "error": "Failed to analyze image (Parsing Error)",
+            "raw_content": content,
+            "defects": [],
+            "severity_breakdown": {"critical": 0, "high": 0, "medium": 0, "low": 0},
+            "overall_severity": "Unknown",
+            "quality_issues": ["Analysis parsing failed"],
+            "recommendations": []
         }
+
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Result returned when no model produced an answer."""
+        error_msg = str(error)
+        print(f"Error during analysis: {error_msg}")
+        import traceback
+        traceback.print_exc()
         
-        IMPORTANT: Return ONLY the JSON string. No markdown formatting.
+        if isinstance(error, LimiterQueueTimeout):
+            user_error = "Analysis queue is full. Please try again shortly."
+        elif isinstance(error, DeadlineExceeded):
+            cancellation_stats.deadline_exceeded += 1
+            user_error = "Analysis timed out. Please try again."
+        elif "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
+            user_error = "Daily Quota Exceeded. Please try again later or upgrade plan."
+        elif "404" in error_msg or "NOT_FOUND" in error_msg:
+             user_error = "Model Not Found or Not Supported in Region."
+        else:
+            user_error = "Analysis Failed: " + error_msg[:50] + "..."
+
+        return {
+            "error": user_error,
+            "defects": [],
+            "severity_breakdown": {"critical": 0, "high": 0, "medium": 0, "low": 0},
+            "overall_severity": "Unknown",
+            "quality_issues": ["Analysis error"],
+            "recommendations": []
+        }
+
+    async def _invoke_models(self, message: "HumanMessage", usage: Optional[List[Dict[str, Any]]] = None, deadline: Optional[float] = None) -> str:
+        """
+        Sends the message to each model in self.models until one answers.
+        Returns the raw text; raises the last error if every model failed.
         """
+        content = None
+        last_error = None
+        
+        # Try models in sequence
+        for index, model_name in enumerate(self.models):
+            try:
+                content = await self._try_analyze_with_model(model_name, message, usage, deadline)
+                if content:
+                    print(f"Success with model: {model_name}")
+                    break
+            except LimiterQueueTimeout:
+                # The next model would wait in the same queue; give up instead
+                raise
+            except DeadlineExceeded:
+                # No time left for the fallbacks
+                cancellation_stats.model_calls_skipped += len(self.models) - index - 1
+                raise
+            except Exception as e:
+                last_error = e
+                print(f"Model {model_name} failed: {e}")
+                # If it's a structural error (not connection), maybe don't retry? 
+                # For now, continue to next model
+                continue
+        
+        if not content:
+            print("All models failed.")
+            raise last_error if last_error else Exception("All models failed to generate content")
 
-        try:
-            with open(image_path, "rb") as image_file:
-                image_data = image_file.read()
-                
-            image_b64 = base64.b64encode(image_data).decode("utf-8")
-            
-            # Construct message with proper structure for LangChain Google integration
-            message = HumanMessage(
-                content=[
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url", 
-                        "image_url": f"data:{mime_type};base64,{image_b64}"
-                    }
-                ]
-            )
+        print(f"Gemini Raw Response (First 500 chars): {content[:500]}")
+        
+        # DEBUG: Save raw response to file if possible (local only)
+        self._write_debug_response(content)
 
+        return content
+
+    async def _analyze_message(self, message: "HumanMessage", usage: Optional[List[Dict[str, Any]]] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Runs a single-image message through the models and parses the answer into the result dictionary."""
+        content = None
+        try:
             print("Sending request to Gemini...")
-            
-            content = None
+            content = await self._invoke_models(message, usage, deadline)
+            return self._parse_content(content)
+
+        except (json.JSONDecodeError, ValueError, SyntaxError) as e:
+            return self._parse_error_result(e, content)
+        except Exception as e:
+            return self._error_result(e)
+
+    async def analyze_image(self, image_path: str, usage: Optional[List[Dict[str, Any]]] = None, deadline: Optional[float] = None, priority: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Analyzes the image using Gemini Vision to identify defects, severity, quality issues, and recommendations.
+        Returns a structured dictionary ready for database storage.
+        Token usage of each model call is appended to `usage` when provided.
+        With a `deadline` (time.monotonic()), outstanding model calls are cancelled when it passes and the
+        usual error result is returned; cancelling the calling task cancels them too.
+        `priority` (a scheduler lane) and `user_id` default to the surrounding work_as() context.
+        """
+        try:
+            message = self._build_message(image_path)
+        except Exception as e:
+            return self._error_result(e)
+        with work_as(priority, user_id):
+            return await self._analyze_message(message, usage, deadline)
+
+    async def analyze_image_data(self, image_data: bytes, mime_type: str, prompt: str = INSPECTION_PROMPT, usage: Optional[List[Dict[str, Any]]] = None, deadline: Optional[float] = None, priority: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Same as analyze_image, for an image already in memory (e.g. a tile or video frame),
+        optionally with a different prompt that asks for the same result structure.
+        """
+        message = _human_message([
+            {"type": "text", "text": prompt},
+            self._inline_image_part(image_data, mime_type)
+        ])
+        with work_as(priority, user_id):
+            return await self._analyze_message(message, usage, deadline)
+
+    async def analyze_images(self, image_paths: List[str], usage: Optional[List[Dict[str, Any]]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Analyzes several images in a single model request (the prompt is sent once).
+        Returns one result per image, in order. An entry is None when the packed answer
+        did not contain a usable result for that image; callers should fall back to analyze_image.
+        If no model answers at all, every entry is the usual error result.
+        """
+        try:
+            message = self._build_packed_message(image_paths)
+
+            print(f"Sending packed request with {len(image_paths)} images to Gemini...")
+            content = await self._invoke_models(message, usage)
+
+            return self._parse_packed_content(content, len(image_paths))
+
+        except Exception as e:
+            error_result = self._error_result(e)
+            return [dict(error_result) for _ in image_paths]
+
+    async def stream_analyze_image(self, image_path: str, usage: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of analyze_image.
+        Yields ("defect", defect) as soon as each defect object is complete in the model output,
+        then a single ("result", structured_data) shaped exactly like analyze_image's return value.
+        """
+        content = None
+        try:
+            message = self._build_message(image_path)
+
+            print("Streaming request to Gemini...")
+
             last_error = None
-            
-            # Try models in sequence
+
             for model_name in self.models:
+                parser = DefectStreamParser()
+                chunks = []
                 try:
-                    content = await self._try_analyze_with_model(model_name, message)
-                    if content:
-                        print(f"Success with model: {model_name}")
-                        break
+                    async for text in self._stream_with_model(model_name, message, usage):
+                        chunks.append(text)
+                        for defect in parser.feed(text):
+                            yield "defect", defect
+                except LimiterQueueTimeout:
+                    raise
                 except Exception as e:
                     last_error = e
                     print(f"Model {model_name} failed: {e}")
-                    # If it's a structural error (not connection), maybe don't retry? 
-                    # For now, continue to next model
+                    if parser.emitted:
+                        # Defects already reached the client; falling back would send them twice
+                        raise
                     continue
-            
+
+                content = "".join(chunks)
+                if content:
+                    print(f"Success with model: {model_name}")
+                    break
+
             if not content:
                 print("All models failed.")
                 raise last_error if last_error else Exception("All models failed to generate content")
 
-            print(f"Gemini Raw Response (First 500 chars): {content[:500]}")
-            
-            # DEBUG: Save raw response to file if possible (local only)
-            if not os.environ.get("VERCEL"):
-                try:
-                    with open("debug_response.txt", "w", encoding="utf-8") as f:
-                        f.write(content)
-                except Exception as e:
-                    print(f"Failed to write debug file: {e}")
+            self._write_debug_response(content)
 
-            # 1. Sanitize the string
-            json_str = self._sanitize_json_string(content.strip())
-            
-            # 2. Parse JSON
-            try:
-                data = json.loads(json_str)
-            except json.JSONDecodeError:
-                # Fallback: Try ast.literal_eval for single-quoted Python dicts
-                import ast
-                try:
-                    print("JSON load failed. Trying ast.literal_eval...")
-                    data = ast.literal_eval(json_str)
-                except (ValueError, SyntaxError) as e:
-                    print(f"Parsing failed completely. Error: {e}")
-                    raise json.JSONDecodeError("Failed to parse JSON or Python dict", json_str, 0)
-            
-            # 3. Validate and Structure Data
-            structured_data = self._validate_and_fix_structure(data)
-            
-            return structured_data
+            yield "result", self._parse_content(content)
 
         except (json.JSONDecodeError, ValueError, SyntaxError) as e:
-            print(f"Parsing Error: {e}")
-            print(f"Failed Content (First 500 chars): {content[:500] if content else 'None'}")
-            return {
-                "error": "Failed to analyze image (Parsing Error)",
-                "raw_content": content,
-                "defects": [],
-                "severity_breakdown": {"critical": 0, "high": 0, "medium": 0, "low": 0},
-                "overall_severity": "Unknown",
-                "quality_issues": ["Analysis parsing failed"],
-                "recommendations": []
-            }
+            yield "result", self._parse_error_result(e, content)
         except Exception as e:
-            error_msg = str(e)
-            print(f"Error during analysis: {error_msg}")
-            import traceback
-            traceback.print_exc()
-            
-            if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-                user_error = "Daily Quota Exceeded. Please try again later or upgrade plan."
-            elif "404" in error_msg or "NOT_FOUND" in error_msg:
-                 user_error = "Model Not Found or Not Supported in Region."
-            else:
-                user_error = "Analysis Failed: " + error_msg[:50] + "..."
-
-            return {
-                "error": user_error,
-                "defects": [],
-                "severity_breakdown": {"critical": 0, "high": 0, "medium": 0, "low": 0},
-                "overall_severity": "Unknown",
-                "quality_issues": ["Analysis error"],
-                "recommendations": []
-            }
+            yield "result", self._error_result(e)
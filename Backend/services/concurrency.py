@@ -0,0 +1,232 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+
+class LimiterQueueTimeout(Exception):
+    """Raised when a call waited longer than max_queue_seconds for a free slot."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an analysis runs past its per-request deadline."""
+
+
+def remaining_seconds(deadline: Optional[float]) -> Optional[float]:
+    """
+    Seconds left until a time.monotonic() deadline, or None when there is no deadline.
+    Raises DeadlineExceeded once the deadline has passed.
+    """
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("Analysis deadline exceeded")
+    return remaining
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True for Gemini quota errors (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    error_msg = str(error)
+    return "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Process-wide AIMD limiter for outbound model calls.
+
+    - Additive increase: the limit grows by ~1 for every `limit` successful calls with healthy latency.
+    - Multiplicative decrease: the limit shrinks on 429/RESOURCE_EXHAUSTED (backoff_ratio) or when
+      latency exceeds `latency_tolerance` x the observed baseline (latency_backoff_ratio).
+    - Waiters are served strictly in arrival order; a waiter that is not admitted within
+      `max_queue_seconds` gets LimiterQueueTimeout instead of piling more load onto the API.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 4,
+        min_limit: float = 1,
+        max_limit: float = 32,
+        backoff_ratio: float = 0.5,
+        latency_backoff_ratio: float = 0.9,
+        latency_tolerance: float = 2.0,
+        max_queue_seconds: float = 30.0,
+        enabled: bool = True,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.backoff_ratio = backoff_ratio
+        self.latency_backoff_ratio = latency_backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.max_queue_seconds = max_queue_seconds
+        self.enabled = enabled
+
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._baseline_latency: Optional[float] = None
+        self._last_decrease = 0.0
+
+        # Counters exported through metrics()
+        self.successes = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.queue_timeouts = 0
+        self._total_wait = 0.0
+        self._admitted = 0
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveConcurrencyLimiter":
+        return cls(
+            initial_limit=float(os.getenv("MODEL_LIMITER_INITIAL", "4")),
+            min_limit=float(os.getenv("MODEL_LIMITER_MIN", "1")),
+            max_limit=float(os.getenv("MODEL_LIMITER_MAX", "32")),
+            max_queue_seconds=float(os.getenv("MODEL_LIMITER_MAX_QUEUE_SECONDS", "30")),
+            enabled=os.getenv("MODEL_LIMITER_ENABLED", "1") == "1",
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self) -> None:
+        """Waits for a slot. The caller must call release() exactly once afterwards."""
+        start = time.monotonic()
+        if self.in_flight < int(self.limit) and not self.queue_depth:
+            self.in_flight += 1
+            self._record_wait(start)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_queue_seconds)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # We were granted a slot just as we gave up; hand it to the next waiter
+                self.in_flight -= 1
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                self.queue_timeouts += 1
+                raise LimiterQueueTimeout(
+                    f"Waited more than {self.max_queue_seconds:.0f}s for a model call slot "
+                    f"(limit={int(self.limit)}, queue={self.queue_depth})"
+                ) from None
+            raise
+        self._record_wait(start)
+
+    def release(self, latency: float, outcome: str) -> None:
+        """
+        Frees a slot and adapts the limit.
+        outcome is one of 'success', 'rate_limited', 'error' or 'cancelled'.
+        """
+        self.in_flight -= 1
+        now = time.monotonic()
+
+        if outcome == "success":
+            self.successes += 1
+            if self._baseline_latency is None:
+                self._baseline_latency = latency
+            else:
+                # Tracks the fast end of the latency distribution, drifting up slowly
+                self._baseline_latency = min(latency, 0.95 * self._baseline_latency + 0.05 * latency)
+
+            if latency > self._baseline_latency * self.latency_tolerance:
+                self._decrease(self.latency_backoff_ratio, now)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif outcome == "rate_limited":
+            self.rate_limited += 1
+            self._decrease(self.backoff_ratio, now)
+        elif outcome == "error":
+            self.errors += 1
+
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Usage:
+            async with model_call_limiter.slot():
+                response = await llm.ainvoke(...)
+        """
+        if not self.enabled:
+            yield
+            return
+
+        await self.acquire()
+        start = time.monotonic()
+        outcome = "success"
+        try:
+            yield
+        except Exception as e:
+            outcome = "rate_limited" if is_rate_limit_error(e) else "error"
+            raise
+        except BaseException:
+            outcome = "cancelled"
+            raise
+        finally:
+            self.release(time.monotonic() - start, outcome)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "current_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "baseline_latency_ms": round(self._baseline_latency * 1000) if self._baseline_latency else None,
+            "successes": self.successes,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "queue_timeouts": self.queue_timeouts,
+            "avg_queue_wait_ms": round(self._total_wait / self._admitted * 1000, 1) if self._admitted else 0.0,
+        }
+
+    def _decrease(self, ratio: float, now: float) -> None:
+        # Calls that were already in flight fail together; only back off once per latency window
+        window = self._baseline_latency or 1.0
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * ratio)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def _record_wait(self, start: float) -> None:
+        self._admitted += 1
+        self._total_wait += time.monotonic() - start
+
+
+class CancellationStats:
+    """Counters for analysis work abandoned before it finished, i.e. quota not spent on results nobody reads."""
+
+    def __init__(self):
+        # Uploads whose client disconnected while the analysis was running
+        self.cancelled_analyses = 0
+        # Analyses (or tiles) that ran out of time
+        self.deadline_exceeded = 0
+        # Model calls abandoned while queued or in flight
+        self.model_calls_cancelled = 0
+        # Model calls never made: fallback models skipped after a deadline, packed images dropped before sending
+        self.model_calls_skipped = 0
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "cancelled_analyses": self.cancelled_analyses,
+            "deadline_exceeded": self.deadline_exceeded,
+            "model_calls_cancelled": self.model_calls_cancelled,
+            "model_calls_skipped": self.model_calls_skipped,
+        }
+
+
+# Shared by every AnalysisService call in this process
+model_call_limiter = AdaptiveConcurrencyLimiter.from_env()
+cancellation_stats = CancellationStats()
@@ -0,0 +1,202 @@
+"""
+Per-user inspection events (created/updated/deleted) pushed to dashboards over WebSocket.
+
+Events are published in-process. With EVENT_BROKER_URL set (tcp://host:port, see event_broker.py),
+every worker sends its events to the broker, which numbers them and fans them out to all workers, so a
+dashboard connected to any worker sees every event and event ids are comparable across workers.
+
+Each user keeps a short history so a reconnecting client can pass the last event id it saw and receive
+what it missed. If the history no longer reaches back that far, the client is told to resync instead.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+RESYNC = {"type": "resync"}
+
+
+class Subscription:
+    """One WebSocket's view of a user's events. get() returns RESYNC after the client fell too far behind."""
+
+    def __init__(self, user_id: str, max_pending: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        # Runs on the subscription's loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop the backlog; the client refetches its list instead of replaying it
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self) -> Dict[str, Any]:
+        event = await self.queue.get()
+        if event is RESYNC:
+            self.overflowed = False
+        return event
+
+
+class EventBus:
+    def __init__(self, history_size: int = 200, max_pending: int = 500, broker_url: Optional[str] = None):
+        self.history_size = history_size
+        self.max_pending = max_pending
+        self.broker_url = broker_url
+        # publish() is also called from sync endpoints running in the threadpool
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history: Dict[str, Deque[Dict[str, Any]]] = {}
+        # Highest event id that has fallen out of each user's history
+        self._evicted_up_to: Dict[str, int] = {}
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        # Called synchronously for every delivered event, from whichever thread delivers it
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._broker_task: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+        # Counters exported through metrics()
+        self.published = 0
+        self.delivered = 0
+        self.resumed = 0
+        self.resyncs = 0
+
+    @classmethod
+    def from_env(cls) -> "EventBus":
+        return cls(
+            history_size=int(os.getenv("EVENT_HISTORY_SIZE", "200")),
+            max_pending=int(os.getenv("EVENT_MAX_PENDING", "500")),
+            broker_url=os.getenv("EVENT_BROKER_URL") or None,
+        )
+
+    async def start(self) -> None:
+        """Connects to the broker, if one is configured. Call once from the app's event loop."""
+        self._loop = asyncio.get_running_loop()
+        if self.broker_url and self._broker_task is None:
+            self._broker_task = asyncio.create_task(self._run_broker())
+
+    async def _run_broker(self) -> None:
+        url = urlparse(self.broker_url)
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(url.hostname, url.port)
+                print(f"Connected to event broker at {self.broker_url}")
+                self._writer = writer
+                while line := await reader.readline():
+                    self._deliver(json.loads(line))
+                print("Event broker closed the connection")
+            except (OSError, ValueError) as e:
+                print(f"Event broker unavailable ({e}); publishing in-process only")
+            finally:
+                self._writer = None
+            await asyncio.sleep(1)
+
+    def publish(self, user_id: str, event_type: str, data: Dict[str, Any]) -> None:
+        """Safe to call from the event loop or from a worker thread."""
+        self.published += 1
+        event = {"type": event_type, "user_id": user_id, "data": data, "time": time.time()}
+        if self._writer is not None and self._loop is not None:
+            # The broker assigns the id and echoes the event back to every worker, including this one
+            line = (json.dumps(event) + "\n").encode()
+            self._loop.call_soon_threadsafe(self._write_to_broker, line)
+            return
+        with self._lock:
+            self._last_id += 1
+            event["id"] = self._last_id
+        self._deliver(event)
+
+    def _write_to_broker(self, line: bytes) -> None:
+        if self._writer is None:
+            # Lost the connection in the meantime; deliver locally rather than drop the event
+            event = json.loads(line)
+            with self._lock:
+                self._last_id += 1
+                event["id"] = self._last_id
+            self._deliver(event)
+            return
+        self._writer.write(line)
+
+    def _deliver(self, event: Dict[str, Any]) -> None:
+        user_id = event["user_id"]
+        with self._lock:
+            self._last_id = max(self._last_id, event["id"])
+            history = self._history.setdefault(user_id, deque(maxlen=self.history_size))
+            if len(history) == history.maxlen:
+                self._evicted_up_to[user_id] = history[0]["id"]
+            history.append(event)
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Event listener failed: {e}")
+        for subscription in subscribers:
+            self.delivered += 1
+            subscription.loop.call_soon_threadsafe(subscription._offer, event)
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Registers an in-process callback for all users' events (e.g. cache invalidation)."""
+        self._listeners.append(listener)
+
+    def subscribe(self, user_id: str, last_event_id: Optional[int] = None) -> Subscription:
+        """
+        Registers a subscriber. With last_event_id, the events the client missed are queued first,
+        or RESYNC when they are no longer available.
+        """
+        subscription = Subscription(user_id, self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            if last_event_id is not None:
+                missed = self._missed_events(user_id, last_event_id)
+                if missed is None:
+                    self.resyncs += 1
+                    subscription._offer(RESYNC)
+                else:
+                    self.resumed += 1
+                    for event in missed:
+                        subscription._offer(event)
+        return subscription
+
+    def _missed_events(self, user_id: str, last_event_id: int) -> Optional[List[Dict[str, Any]]]:
+        if last_event_id > self._last_id:
+            # Ids from before a restart (or from another worker without a broker)
+            return None
+        if last_event_id < self._evicted_up_to.get(user_id, 0):
+            return None
+        return [event for event in self._history.get(user_id, ()) if event["id"] > last_event_id]
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "broker": self.broker_url,
+            "broker_connected": self._writer is not None,
+            "last_event_id": self._last_id,
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "resumed": self.resumed,
+            "resyncs": self.resyncs,
+        }
+
+
+event_bus = EventBus.from_env()
@@ -0,0 +1,92 @@
+"""
+Conditional GET support for the inspection endpoints.
+
+ETags are derived from cheap columns (id, status, updated_at/created_at for a single inspection; row count,
+max id and latest change for a listing), so a poll that hasn't changed is answered with 304 without loading
+the analysis_result JSON. Serialized bodies are kept in a small per-user LRU keyed by the same ETag, so an
+unchanged resource is also not re-serialized for clients that don't send If-None-Match.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Clients may store responses but must revalidate them on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:24]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Per-user LRU of serialized response bodies, each stored with the ETag it was rendered for."""
+
+    def __init__(self, max_entries_per_user: int = 32, max_users: int = 1000):
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        # Sync endpoints run in the threadpool, event listeners may run on the loop
+        self._lock = threading.Lock()
+        self._scopes: "OrderedDict[str, OrderedDict[str, Tuple[str, bytes]]]" = OrderedDict()
+
+        # Counters exported through metrics()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def get(self, scope: str, key: str, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entries = self._scopes.get(scope)
+            entry = entries.get(key) if entries else None
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._scopes.move_to_end(scope)
+            entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, scope: str, key: str, etag: str, body: bytes) -> None:
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is None:
+                entries = self._scopes[scope] = OrderedDict()
+                if len(self._scopes) > self.max_users:
+                    self._scopes.popitem(last=False)
+            self._scopes.move_to_end(scope)
+            entries[key] = (etag, body)
+            entries.move_to_end(key)
+            if len(entries) > self.max_entries_per_user:
+                entries.popitem(last=False)
+
+    def invalidate(self, scope: str) -> None:
+        with self._lock:
+            if self._scopes.pop(scope, None) is not None:
+                self.invalidations += 1
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            entries = sum(len(entries) for entries in self._scopes.values())
+            bytes_cached = sum(len(body) for entries in self._scopes.values() for _, body in entries.values())
+        return {
+            "scopes": len(self._scopes),
+            "entries": entries,
+            "bytes": bytes_cached,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,172 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+from services.analysis_service import AnalysisService, INSPECTION_PROMPT
+from services.concurrency import cancellation_stats, remaining_seconds, DeadlineExceeded
+from services.scheduler import LANES, current_work, work_as
+
+# Rough size of the prompt that packing avoids re-sending (~4 characters per token)
+PROMPT_TOKENS_ESTIMATE = len(INSPECTION_PROMPT) // 4
+
+
+class _PendingImage:
+    def __init__(self, image_path: str, size: int, usage: Optional[List[Dict[str, Any]]]):
+        self.image_path = image_path
+        self.size = size
+        self.usage = usage
+        # The batch task doesn't run in the caller's context, so remember where its calls belong
+        self.lane, self.user_id = current_work()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class ImageBatcher:
+    """
+    Packs concurrent analysis requests into multi-image model calls.
+
+    Pending images are flushed as one AnalysisService.analyze_images call when `max_images` are waiting,
+    when adding another image would exceed `max_bytes`, or `window_seconds` after the first one arrived.
+    Each caller still gets its own result; images the packed answer did not cover are re-analyzed alone.
+    A packed call is scheduled in the highest-priority lane among its images.
+    """
+
+    def __init__(self, service: AnalysisService, max_images: int = 4, max_bytes: int = 8 * 1024 * 1024, window_seconds: float = 0.5):
+        self.service = service
+        self.max_images = max_images
+        self.max_bytes = max_bytes
+        self.window_seconds = window_seconds
+
+        self._pending: List[_PendingImage] = []
+        self._pending_bytes = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        # Counters exported through metrics()
+        self.images = 0
+        self.packed_requests = 0
+        self.packed_images = 0
+        self.single_requests = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_env(cls, service: AnalysisService) -> "ImageBatcher":
+        return cls(
+            service,
+            max_images=int(os.getenv("PACKING_MAX_IMAGES", "4")),
+            max_bytes=int(os.getenv("PACKING_MAX_BYTES", str(8 * 1024 * 1024))),
+            window_seconds=float(os.getenv("PACKING_WINDOW_MS", "500")) / 1000,
+        )
+
+    async def analyze(self, image_path: str, usage: Optional[List[Dict[str, Any]]] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Drop-in replacement for AnalysisService.analyze_image."""
+        self.images += 1
+        size = os.path.getsize(image_path)
+        if size > self.max_bytes or self.max_images <= 1:
+            # Too large to share a request with anything else
+            self.single_requests += 1
+            return await self.service.analyze_image(image_path, usage=usage, deadline=deadline)
+
+        if self._pending and self._pending_bytes + size > self.max_bytes:
+            self._flush()
+
+        pending = _PendingImage(image_path, size, usage)
+        self._pending.append(pending)
+        self._pending_bytes += size
+
+        if len(self._pending) >= self.max_images:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_seconds, self._flush)
+
+        # The packed call is shared, so a deadline only stops waiting for it. Waiting is cancelled
+        # (which also drops the image if its batch hasn't been sent yet) and the usual error result returned.
+        try:
+            return await asyncio.wait_for(pending.future, timeout=remaining_seconds(deadline))
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            return self.service._error_result(DeadlineExceeded("Analysis deadline exceeded"))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_bytes = self._pending, [], 0
+        # Images whose caller gave up (disconnect or deadline) aren't worth sending
+        live = [item for item in batch if not item.future.done()]
+        cancellation_stats.model_calls_skipped += len(batch) - len(live)
+        batch = live
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_PendingImage]) -> None:
+        try:
+            if len(batch) == 1:
+                self.single_requests += 1
+                item = batch[0]
+                result = await self.service.analyze_image(item.image_path, usage=item.usage, priority=item.lane, user_id=item.user_id)
+                self._resolve(item, result)
+                return
+
+            usage: List[Dict[str, Any]] = []
+            lead = min(batch, key=lambda item: LANES.index(item.lane))
+            with work_as(lead.lane, lead.user_id):
+                results = await self.service.analyze_images([item.image_path for item in batch], usage=usage)
+            self.packed_requests += 1
+            self.packed_images += len(batch)
+            self._split_usage(batch, usage)
+
+            retries = []
+            for item, result in zip(batch, results):
+                if result is None:
+                    retries.append(item)
+                else:
+                    self._resolve(item, result)
+
+            if retries:
+                print(f"Packed response missed {len(retries)} of {len(batch)} images; analyzing them individually.")
+                self.fallbacks += len(retries)
+                self.single_requests += len(retries)
+                fallback_results = await asyncio.gather(
+                    *[self.service.analyze_image(item.image_path, usage=item.usage, priority=item.lane, user_id=item.user_id) for item in retries]
+                )
+                for item, result in zip(retries, fallback_results):
+                    self._resolve(item, result)
+        except BaseException as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
+    @staticmethod
+    def _split_usage(batch: List[_PendingImage], usage: List[Dict[str, Any]]) -> None:
+        """Attributes an equal share of the packed call's tokens to each image."""
+        count = len(batch)
+        for record in usage:
+            for position, item in enumerate(batch):
+                if item.usage is None:
+                    continue
+                share = {"model_name": record["model_name"]}
+                for key in ("input_tokens", "output_tokens", "total_tokens"):
+                    # The remainder goes to the first image so the totals still add up
+                    share[key] = record[key] // count + (record[key] % count if position == 0 else 0)
+                item.usage.append(share)
+
+    @staticmethod
+    def _resolve(item: _PendingImage, result: Dict[str, Any]) -> None:
+        if not item.future.done():
+            item.future.set_result(result)
+
+    def metrics(self) -> Dict[str, Any]:
+        requests = self.packed_requests + self.single_requests
+        return {
+            "images": self.images,
+            "model_requests": requests,
+            "packed_requests": self.packed_requests,
+            "packed_images": self.packed_images,
+            "fallbacks": self.fallbacks,
+            "model_requests_saved": max(0, self.images - requests),
+            "estimated_prompt_tokens_saved": (self.packed_images - self.packed_requests) * PROMPT_TOKENS_ESTIMATE,
+        }
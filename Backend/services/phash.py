@@ -0,0 +1,173 @@
+"""
+Perceptual hashing and a multi-index hash table for finding near-identical frames.
+
+Consecutive camera frames of the same part differ only by sensor noise, so their bytes never match but
+their 64-bit pHash values land within a few bits of each other. The index is kept per (user, product)
+scope and loaded lazily from the phash column of inspection_profiles.
+"""
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+# NumPy and Pillow are imported on first hash so they stay out of the API's cold start
+if TYPE_CHECKING:
+    import numpy as np
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(n: int) -> "np.ndarray":
+    import numpy as np
+
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def phash_array(gray: "np.ndarray") -> int:
+    """64-bit DCT perceptual hash of a 2-D grayscale array (any size)."""
+    import numpy as np
+    from PIL import Image
+
+    dct = _dct_matrix(DCT_SIZE)
+    small = Image.fromarray(np.asarray(gray, dtype=np.uint8)).resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.float64)
+    coefficients = dct @ pixels @ dct.T
+    low = coefficients[:HASH_SIZE, :HASH_SIZE].flatten()
+    # Skip the DC term when taking the median; it only encodes overall brightness
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def phash_file(image_path: str) -> int:
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        return phash_array(np.asarray(image.convert("L")))
+
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHashTable:
+    """
+    Exact Hamming-radius search over 64-bit hashes.
+
+    The hash is cut into max_distance + 1 chunks, each with its own table. By the pigeonhole principle,
+    two hashes within max_distance bits agree exactly on at least one chunk, so only the items sharing a
+    chunk with the query need a full distance check.
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        widths = [64 // chunks + (1 if i < 64 % chunks else 0) for i in range(chunks)]
+        self._slices = []
+        shift = 0
+        for width in widths:
+            self._slices.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in widths]
+        self._hashes: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, value: int, item: int) -> None:
+        self._hashes[item] = value
+        for table, (shift, mask) in zip(self._tables, self._slices):
+            table.setdefault((value >> shift) & mask, []).append(item)
+
+    def remove(self, item: int) -> None:
+        value = self._hashes.pop(item, None)
+        if value is None:
+            return
+        for table, (shift, mask) in zip(self._tables, self._slices):
+            bucket = table.get((value >> shift) & mask)
+            if bucket and item in bucket:
+                bucket.remove(item)
+
+    def search(self, value: int, max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+        """All (distance, item) pairs within max_distance (at most the table's own), nearest first."""
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        candidates = set()
+        for table, (shift, mask) in zip(self._tables, self._slices):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        found = []
+        for item in candidates:
+            distance = hamming(value, self._hashes[item])
+            if distance <= max_distance:
+                found.append((distance, item))
+        found.sort()
+        return found
+
+
+class NearDuplicateIndex:
+    """
+    In-memory near-duplicate lookup over completed inspections, scoped per (user_id, product).
+    Scopes are loaded from the database on first use; later uploads are added as they complete.
+    """
+
+    def __init__(self, max_distance: int = 6):
+        self.max_distance = max_distance
+        self._tables: Dict[Tuple[str, Optional[str]], MultiIndexHashTable] = {}
+        self._scope_of: Dict[int, Tuple[str, Optional[str]]] = {}
+
+    def _table(self, db: Session, user_id: str, product: Optional[str]) -> MultiIndexHashTable:
+        scope = (user_id, product)
+        table = self._tables.get(scope)
+        if table is None:
+            table = MultiIndexHashTable(self.max_distance)
+            rows = db.query(models.InspectionProfile.id, models.InspectionProfile.phash)\
+                .filter(models.InspectionProfile.user_id == user_id)\
+                .filter(models.InspectionProfile.product == product if product else models.InspectionProfile.product.is_(None))\
+                .filter(models.InspectionProfile.status == "completed")\
+                .filter(models.InspectionProfile.phash.isnot(None))\
+                .all()
+            for inspection_id, phash in rows:
+                table.add(int(phash, 16), inspection_id)
+                self._scope_of[inspection_id] = scope
+            self._tables[scope] = table
+        return table
+
+    def find(self, db: Session, user_id: str, product: Optional[str], value: int) -> Optional[Tuple[int, int]]:
+        """Nearest (inspection_id, distance) within max_distance, or None."""
+        matches = self._table(db, user_id, product).search(value)
+        if not matches:
+            return None
+        distance, inspection_id = matches[0]
+        return inspection_id, distance
+
+    def add(self, user_id: str, product: Optional[str], value: int, inspection_id: int) -> None:
+        scope = (user_id, product)
+        table = self._tables.get(scope)
+        # Unloaded scopes will pick the row up from the database when first used
+        if table is not None:
+            table.add(value, inspection_id)
+            self._scope_of[inspection_id] = scope
+
+    def discard(self, inspection_id: int) -> None:
+        scope = self._scope_of.pop(inspection_id, None)
+        if scope in self._tables:
+            self._tables[scope].remove(inspection_id)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "scopes": len(self._tables),
+            "hashes": sum(len(table) for table in self._tables.values()),
+            "max_distance": self.max_distance,
+        }
@@ -0,0 +1,196 @@
+"""
+CPU-only anomaly pre-screen that can auto-pass obviously clean parts before they reach Gemini.
+
+Each product has a profile of "golden" reference statistics (per-pixel mean/std of the normalized
+grayscale image and of its edge magnitude), built by calibrate_prescreen.py. An upload is scored by
+how far its pixels and edges deviate from that profile; images scoring below the calibrated
+threshold are auto-passed, everything else still goes to the model.
+"""
+import os
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+# NumPy and Pillow are imported where used so a disabled pre-screen costs nothing at startup
+if TYPE_CHECKING:
+    import numpy as np
+
+PROFILE_SIZE = (128, 128)
+# Floor for per-pixel std so perfectly uniform regions don't turn sensor noise into huge z-scores
+MIN_STD = 0.05
+# Scores use a high percentile instead of the max so a few hot pixels don't fail a clean part
+SCORE_PERCENTILE = 99.5
+
+
+def load_normalized(image_path: str) -> "np.ndarray":
+    """Grayscale, resized to PROFILE_SIZE and standardized to zero mean / unit variance (removes lighting drift)."""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        gray = np.asarray(image.convert("L").resize(PROFILE_SIZE, Image.BILINEAR), dtype=np.float32)
+    return (gray - gray.mean()) / (gray.std() + 1e-6)
+
+
+def edge_magnitude(gray: "np.ndarray") -> "np.ndarray":
+    """Central-difference gradient magnitude."""
+    import numpy as np
+
+    gx = np.zeros_like(gray)
+    gy = np.zeros_like(gray)
+    gx[:, 1:-1] = gray[:, 2:] - gray[:, :-2]
+    gy[1:-1, :] = gray[2:, :] - gray[:-2, :]
+    return np.hypot(gx, gy)
+
+
+def _profile_filename(product: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", product) + ".npz"
+
+
+class PrescreenProfile:
+    def __init__(self, product: str, mean: "np.ndarray", std: "np.ndarray", edge_mean: "np.ndarray", edge_std: "np.ndarray", threshold: float = 0.0):
+        self.product = product
+        self.mean = mean
+        self.std = std
+        self.edge_mean = edge_mean
+        self.edge_std = edge_std
+        # Scores strictly below the threshold are auto-passed; 0 disables auto-pass
+        self.threshold = threshold
+
+    @classmethod
+    def fit(cls, product: str, image_paths: List[str]) -> "PrescreenProfile":
+        import numpy as np
+
+        grays = np.stack([load_normalized(path) for path in image_paths])
+        edges = np.stack([edge_magnitude(gray) for gray in grays])
+        return cls(
+            product,
+            mean=grays.mean(axis=0),
+            std=np.maximum(grays.std(axis=0), MIN_STD),
+            edge_mean=edges.mean(axis=0),
+            edge_std=np.maximum(edges.std(axis=0), MIN_STD),
+        )
+
+    def score(self, image_path: str) -> float:
+        """Anomaly score: high-percentile z-score of intensity and edge deviation, whichever is larger."""
+        import numpy as np
+
+        gray = load_normalized(image_path)
+        intensity_z = np.abs(gray - self.mean) / self.std
+        edge_z = np.abs(edge_magnitude(gray) - self.edge_mean) / self.edge_std
+        return float(max(np.percentile(intensity_z, SCORE_PERCENTILE), np.percentile(edge_z, SCORE_PERCENTILE)))
+
+    def save(self, directory: str) -> str:
+        import numpy as np
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, _profile_filename(self.product))
+        np.savez_compressed(
+            path,
+            mean=self.mean,
+            std=self.std,
+            edge_mean=self.edge_mean,
+            edge_std=self.edge_std,
+            threshold=np.float32(self.threshold),
+        )
+        return path
+
+    @classmethod
+    def load(cls, directory: str, product: str) -> Optional["PrescreenProfile"]:
+        path = os.path.join(directory, _profile_filename(product))
+        if not os.path.exists(path):
+            return None
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls(
+                product,
+                mean=data["mean"],
+                std=data["std"],
+                edge_mean=data["edge_mean"],
+                edge_std=data["edge_std"],
+                threshold=float(data["threshold"]),
+            )
+
+
+class Prescreener:
+    """Scores uploads against their product profile and decides whether the model is needed."""
+
+    def __init__(self, profile_dir: str):
+        self.profile_dir = profile_dir
+        self._profiles: Dict[str, Optional[PrescreenProfile]] = {}
+
+        # Counters exported through metrics()
+        self.screened = 0
+        self.auto_passed = 0
+        self.sent_to_model = 0
+        self.no_profile = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["Prescreener"]:
+        if os.getenv("PRESCREEN_ENABLED") != "1":
+            return None
+        return cls(os.getenv("PRESCREEN_PROFILE_DIR", "prescreen_profiles"))
+
+    def profile(self, product: str) -> Optional[PrescreenProfile]:
+        if product not in self._profiles:
+            self._profiles[product] = PrescreenProfile.load(self.profile_dir, product)
+        return self._profiles[product]
+
+    def screen(self, image_path: str, product: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Returns None when the image can't be screened (no product or profile),
+        otherwise {"decision": "pass" | "model", "score", "threshold", "confidence"}.
+        """
+        profile = self.profile(product) if product else None
+        if profile is None or profile.threshold <= 0:
+            self.no_profile += 1
+            return None
+
+        try:
+            score = profile.score(image_path)
+        except Exception as e:
+            print(f"Pre-screen failed for {image_path}: {e}")
+            self.errors += 1
+            return None
+
+        self.screened += 1
+        if score < profile.threshold:
+            self.auto_passed += 1
+            decision = "pass"
+            # How far below the threshold we are: 0 at the threshold, 1 for a perfect match
+            confidence = 1.0 - score / profile.threshold
+        else:
+            self.sent_to_model += 1
+            decision = "model"
+            confidence = None
+
+        return {
+            "decision": decision,
+            "product": product,
+            "score": round(score, 4),
+            "threshold": round(profile.threshold, 4),
+            "confidence": round(confidence, 4) if confidence is not None else None,
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "screened": self.screened,
+            "auto_passed": self.auto_passed,
+            "sent_to_model": self.sent_to_model,
+            "no_profile": self.no_profile,
+            "errors": self.errors,
+            "skip_rate": round(self.auto_passed / self.screened, 4) if self.screened else 0.0,
+        }
+
+
+def auto_pass_result(screen: Dict[str, Any]) -> Dict[str, Any]:
+    """Analysis result recorded for an image the pre-screen passed without calling the model."""
+    return {
+        "defects": [],
+        "severity_breakdown": {"critical": 0, "high": 0, "medium": 0, "low": 0},
+        "overall_severity": "Low",
+        "quality_issues": [],
+        "recommendations": [],
+        "prescreen": screen,
+    }
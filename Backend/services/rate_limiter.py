@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+
+import database
+import models
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float, tokens: Optional[float] = None, updated: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity if tokens is None else tokens
+        self.updated = time.time() if updated is None else updated
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def try_consume(self, amount: float = 1, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Returns (allowed, retry_after_seconds)."""
+        self._refill(time.time() if now is None else now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True, 0.0
+        return False, (amount - self.tokens) / self.rate if self.rate else float("inf")
+
+    async def wait(self, amount: float = 1) -> None:
+        """Blocks until `amount` tokens are available and consumes them."""
+        while True:
+            allowed, retry_after = self.try_consume(amount)
+            if allowed:
+                return
+            await asyncio.sleep(retry_after)
+
+
+class UserRateLimiter:
+    """
+    Per-user token buckets for /upload.
+
+    The "memory" backend keeps buckets in this process. The "database" backend stores them in the
+    rate_limit_buckets table so every worker sharing DATABASE_URL (SQLite or Postgres) sees the same budget.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: float, backend: str = "memory"):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.backend = backend
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.allowed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "UserRateLimiter":
+        return cls(
+            rate_per_minute=float(os.getenv("UPLOAD_RATE_PER_MINUTE", "10")),
+            burst=float(os.getenv("UPLOAD_RATE_BURST", "20")),
+            backend=os.getenv("RATE_LIMIT_BACKEND", "memory"),
+        )
+
+    def check(self, user_id: str) -> Tuple[bool, float]:
+        """Consumes one token for the user. Returns (allowed, retry_after_seconds)."""
+        if self.backend == "database" and database.SessionLocal is not None:
+            allowed, retry_after = self._check_database(user_id)
+        else:
+            allowed, retry_after = self._check_memory(user_id)
+
+        if allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return allowed, retry_after
+
+    def _check_memory(self, user_id: str) -> Tuple[bool, float]:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.capacity)
+        return bucket.try_consume()
+
+    def _check_database(self, user_id: str, retry: bool = True) -> Tuple[bool, float]:
+        """
+        Refill and consume happen in one conditional UPDATE, so concurrent workers can't both spend the
+        same token. A plain read-modify-write isn't safe here: SQLite takes no lock on the SELECT and
+        ignores FOR UPDATE.
+        """
+        Bucket = models.RateLimitBucket
+        now = time.time()
+        elapsed = case((Bucket.updated > now, 0.0), else_=now - Bucket.updated)
+        refilled = case(
+            (Bucket.tokens + elapsed * self.rate > self.capacity, self.capacity),
+            else_=Bucket.tokens + elapsed * self.rate,
+        )
+
+        db = database.SessionLocal()
+        try:
+            consumed = db.execute(
+                update(Bucket)
+                .where(Bucket.user_id == user_id, refilled >= 1)
+                .values(tokens=refilled - 1, updated=case((Bucket.updated > now, Bucket.updated), else_=now))
+                .execution_options(synchronize_session=False)
+            )
+            if consumed.rowcount == 1:
+                db.commit()
+                return True, 0.0
+            db.rollback()
+
+            row = db.query(Bucket).filter(Bucket.user_id == user_id).first()
+            if row is None:
+                # First upload of this user: create the bucket with this upload's token already spent
+                db.add(Bucket(user_id=user_id, tokens=self.capacity - 1, updated=now))
+                db.commit()
+                return True, 0.0
+
+            # Not enough tokens; the refill time is computed without writing anything
+            bucket = TokenBucket(self.rate, self.capacity, tokens=row.tokens, updated=row.updated)
+            allowed, retry_after = bucket.try_consume(now=now)
+            if allowed and retry:
+                # Another worker refilled the row in between; try the UPDATE again
+                return self._check_database(user_id, retry=False)
+            return False, max(retry_after, 0.0)
+        except IntegrityError:
+            # Another worker created the row first; go through the UPDATE again
+            db.rollback()
+            if retry:
+                return self._check_database(user_id, retry=False)
+            raise
+        finally:
+            db.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst": self.capacity,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "tracked_users": len(self._buckets),
+        }
+
+
+upload_rate_limiter = UserRateLimiter.from_env()
@@ -0,0 +1,298 @@
+"""
+Priority lanes in front of the model call limiter.
+
+Every model call waits here for admission before it takes a limiter slot. At most `model_call_limiter.limit`
+calls are admitted at a time, so the limiter's own FIFO queue stays empty and this scheduler decides the order.
+The limiter's max_queue_seconds applies to the wait here instead: a call not admitted in time gets
+LimiterQueueTimeout, exactly as it would from the limiter.
+
+- Lanes: interactive work (live uploads) is always admitted before batch (backfills, bulk uploads),
+  and batch before background.
+- Starvation guarantee: a batch or background call that has waited longer than its lane's max wait is
+  admitted ahead of its lane, but at most one in every `promote_every` admissions is such a promotion. Lower
+  lanes keep making progress under sustained interactive load, and an aged backfill can't take it all over.
+- Within a lane, users share admissions by weight (stride scheduling), so one user's burst can't
+  monopolize the lane.
+
+The lane and user of a call are taken from the surrounding context, set with work_as().
+"""
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from services.concurrency import model_call_limiter, LimiterQueueTimeout
+
+LANES = ("interactive", "batch", "background")
+DEFAULT_LANE = "interactive"
+
+# Upper bounds (ms) of the wait-time histogram buckets; the last bucket is open-ended
+WAIT_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+_current_work: contextvars.ContextVar = contextvars.ContextVar("analysis_work", default=(DEFAULT_LANE, None))
+
+
+def current_work() -> Tuple[str, Optional[str]]:
+    """The (lane, user_id) that model calls made here would be queued under."""
+    return _current_work.get()
+
+
+@contextmanager
+def work_as(lane: Optional[str] = None, user_id: Optional[str] = None):
+    """
+    Runs the enclosed analysis (and any tasks it starts) in `lane` on behalf of `user_id`.
+    Arguments left as None keep the surrounding value.
+    """
+    current_lane, current_user = _current_work.get()
+    if lane is not None and lane not in LANES:
+        raise ValueError(f"Unknown priority lane {lane!r}; expected one of {', '.join(LANES)}")
+    token = _current_work.set((lane or current_lane, user_id if user_id is not None else current_user))
+    try:
+        yield
+    finally:
+        _current_work.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("future", "lane", "user_id", "enqueued")
+
+    def __init__(self, future: asyncio.Future, lane: str, user_id: str):
+        self.future = future
+        self.lane = lane
+        self.user_id = user_id
+        self.enqueued = time.monotonic()
+
+
+class _Lane:
+    """Per-user FIFO queues, served by stride scheduling over user weights."""
+
+    def __init__(self, name: str, max_wait_seconds: Optional[float]):
+        self.name = name
+        self.max_wait_seconds = max_wait_seconds
+        self.queues: Dict[str, Deque[_Waiter]] = {}
+        self._passes: Dict[str, float] = {}
+        self._virtual_time = 0.0
+
+        # Counters exported through metrics()
+        self.admitted = 0
+        self.promoted = 0
+        self.queue_timeouts = 0
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.total_wait = 0.0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def push(self, waiter: _Waiter) -> None:
+        queue = self.queues.get(waiter.user_id)
+        if queue is None:
+            queue = self.queues[waiter.user_id] = deque()
+            # A user who was idle starts at the lane's current virtual time instead of catching up
+            self._passes[waiter.user_id] = max(self._passes.get(waiter.user_id, 0.0), self._virtual_time)
+        queue.append(waiter)
+
+    def remove(self, waiter: _Waiter) -> None:
+        queue = self.queues.get(waiter.user_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                self._drop_user(waiter.user_id)
+
+    def oldest(self) -> Optional[_Waiter]:
+        heads = [queue[0] for queue in self.queues.values()]
+        return min(heads, key=lambda waiter: waiter.enqueued) if heads else None
+
+    def pop_fair(self, weights: Dict[str, float]) -> _Waiter:
+        user_id = min(self.queues, key=lambda user: self._passes[user])
+        return self._pop(user_id, weights)
+
+    def pop_oldest(self, weights: Dict[str, float]) -> _Waiter:
+        self.promoted += 1
+        return self._pop(self.oldest().user_id, weights)
+
+    def _pop(self, user_id: str, weights: Dict[str, float]) -> _Waiter:
+        queue = self.queues[user_id]
+        waiter = queue.popleft()
+        self._virtual_time = self._passes[user_id]
+        self._passes[user_id] += 1.0 / weights.get(user_id, 1.0)
+        if not queue:
+            self._drop_user(user_id)
+        return waiter
+
+    def _drop_user(self, user_id: str) -> None:
+        del self.queues[user_id]
+        # Keep the pass only while it is ahead of the lane, so idle users don't accumulate state
+        if self._passes.get(user_id, 0.0) <= self._virtual_time:
+            self._passes.pop(user_id, None)
+
+    def record_wait(self, seconds: float) -> None:
+        self.admitted += 1
+        self.total_wait += seconds
+        waited_ms = seconds * 1000
+        for index, bound in enumerate(WAIT_BUCKETS_MS):
+            if waited_ms <= bound:
+                self.wait_histogram[index] += 1
+                return
+        self.wait_histogram[-1] += 1
+
+
+class AnalysisScheduler:
+    def __init__(
+        self,
+        max_wait_seconds: Optional[Dict[str, float]] = None,
+        user_weights: Optional[Dict[str, float]] = None,
+        capacity: int = 8,
+        promote_every: int = 4,
+        enabled: bool = True,
+    ):
+        max_wait_seconds = max_wait_seconds or {"batch": 15.0, "background": 60.0}
+        self._lanes = {name: _Lane(name, max_wait_seconds.get(name)) for name in LANES}
+        self.user_weights = user_weights or {}
+        # Only used when the model call limiter is disabled; otherwise its current limit is the capacity
+        self.fallback_capacity = capacity
+        self.promote_every = max(1, promote_every)
+        self.enabled = enabled
+        self.in_flight = 0
+        self._since_promotion = 0
+
+    @classmethod
+    def from_env(cls) -> "AnalysisScheduler":
+        # SCHEDULER_USER_WEIGHTS="uid-a=4,uid-b=2"; unlisted users weigh 1
+        weights = {}
+        for item in os.getenv("SCHEDULER_USER_WEIGHTS", "").split(","):
+            if "=" in item:
+                user_id, weight = item.split("=", 1)
+                weights[user_id.strip()] = float(weight)
+        return cls(
+            max_wait_seconds={
+                "batch": float(os.getenv("SCHEDULER_BATCH_MAX_WAIT_SECONDS", "15")),
+                "background": float(os.getenv("SCHEDULER_BACKGROUND_MAX_WAIT_SECONDS", "60")),
+            },
+            user_weights=weights,
+            capacity=int(os.getenv("SCHEDULER_CAPACITY", "8")),
+            promote_every=int(os.getenv("SCHEDULER_PROMOTE_EVERY", "4")),
+            enabled=os.getenv("SCHEDULER_ENABLED", "1") == "1",
+        )
+
+    @property
+    def capacity(self) -> int:
+        if model_call_limiter.enabled:
+            return max(1, int(model_call_limiter.limit))
+        return self.fallback_capacity
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(lane.depth for lane in self._lanes.values())
+
+    async def acquire(self, lane: str, user_id: Optional[str]) -> None:
+        """Waits for admission. The caller must call release() exactly once afterwards."""
+        queued = self._lanes[lane]
+        if self.in_flight < self.capacity and not self.queue_depth:
+            self.in_flight += 1
+            queued.record_wait(0.0)
+            return
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), lane, user_id or "")
+        queued.push(waiter)
+        max_queue_seconds = model_call_limiter.max_queue_seconds
+        try:
+            await asyncio.wait_for(waiter.future, timeout=max_queue_seconds)
+        except BaseException as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as we gave up; pass the slot on
+                self.in_flight -= 1
+                self._wake()
+            else:
+                queued.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                queued.queue_timeouts += 1
+                model_call_limiter.queue_timeouts += 1
+                raise LimiterQueueTimeout(
+                    f"Waited more than {max_queue_seconds:.0f}s in the {lane} lane for a model call slot "
+                    f"(capacity={self.capacity}, queue={self.queue_depth})"
+                ) from None
+            raise
+        queued.record_wait(time.monotonic() - waiter.enqueued)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Usage:
+            async with analysis_scheduler.slot():
+                async with model_call_limiter.slot():
+                    ...
+        """
+        if not self.enabled:
+            yield
+            return
+        lane, user_id = _current_work.get()
+        await self.acquire(lane, user_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _next(self) -> Optional[_Waiter]:
+        # Starvation guarantee first: the longest-overdue waiter of a lower lane, rate-limited by promote_every
+        if self._since_promotion >= self.promote_every - 1:
+            now = time.monotonic()
+            overdue: List[Tuple[float, _Lane]] = []
+            for lane in self._lanes.values():
+                oldest = lane.oldest()
+                if oldest and lane.max_wait_seconds is not None and now - oldest.enqueued >= lane.max_wait_seconds:
+                    overdue.append((oldest.enqueued, lane))
+            if overdue:
+                self._since_promotion = 0
+                return min(overdue, key=lambda item: item[0])[1].pop_oldest(self.user_weights)
+
+        for name in LANES:
+            lane = self._lanes[name]
+            if lane.queues:
+                self._since_promotion += 1
+                return lane.pop_fair(self.user_weights)
+        return None
+
+    def _wake(self) -> None:
+        while self.in_flight < self.capacity:
+            waiter = self._next()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                continue
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+    def metrics(self) -> Dict[str, Any]:
+        lanes = {}
+        for name, lane in self._lanes.items():
+            oldest = lane.oldest()
+            histogram = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, lane.wait_histogram)}
+            histogram[f"gt_{WAIT_BUCKETS_MS[-1]}ms"] = lane.wait_histogram[-1]
+            lanes[name] = {
+                "queue_depth": lane.depth,
+                "waiting_users": len(lane.queues),
+                "oldest_wait_ms": round((time.monotonic() - oldest.enqueued) * 1000) if oldest else 0,
+                "admitted": lane.admitted,
+                "promoted": lane.promoted,
+                "queue_timeouts": lane.queue_timeouts,
+                "avg_wait_ms": round(lane.total_wait / lane.admitted * 1000, 1) if lane.admitted else 0.0,
+                "wait_histogram": histogram,
+            }
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "lanes": lanes,
+        }
+
+
+# Shared by every AnalysisService call in this process
+analysis_scheduler = AnalysisScheduler.from_env()
@@ -0,0 +1,60 @@
+"""
+Minimal stand-in for ChatGoogleGenerativeAI that talks to the local stub server (stub_server.py).
+AnalysisService switches to it when ANALYSIS_STUB_URL is set, e.g. http://127.0.0.1:8100
+"""
+from typing import Any, AsyncIterator, Dict, List
+
+import httpx
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class StubChatModel:
+    def __init__(self, model: str, base_url: str, timeout: float = 120.0):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _payload(self, messages: List[Any]) -> Dict[str, Any]:
+        """Summarizes the messages; the stub only needs the prompt and image count/size."""
+        text_parts = []
+        images = 0
+        image_chars = 0
+        for message in messages:
+            content = message.content if isinstance(message.content, list) else [message.content]
+            for part in content:
+                if isinstance(part, str):
+                    text_parts.append(part)
+                elif part.get("type") == "text":
+                    text_parts.append(part["text"])
+                elif part.get("type") == "image_url":
+                    images += 1
+                    image_chars += len(str(part["image_url"]))
+        return {
+            "model": self.model,
+            "prompt": "\n".join(text_parts),
+            "images": images,
+            "image_chars": image_chars,
+        }
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response) -> None:
+        # Mirror the Gemini error text so callers' "429"/"RESOURCE_EXHAUSTED" checks keep working
+        if response.status_code >= 400:
+            raise Exception(f"{response.status_code} {response.text}")
+
+    async def ainvoke(self, messages: List[Any]) -> AIMessage:
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout) as client:
+            response = await client.post("/generate", json=self._payload(messages))
+            self._raise_for_status(response)
+            data = response.json()
+        return AIMessage(content=data["text"], usage_metadata=data.get("usage"))
+
+    async def astream(self, messages: List[Any]) -> AsyncIterator[AIMessageChunk]:
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout) as client:
+            async with client.stream("POST", "/stream", json=self._payload(messages)) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    self._raise_for_status(response)
+                async for text in response.aiter_text():
+                    if text:
+                        yield AIMessageChunk(content=text)
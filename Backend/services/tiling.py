@@ -0,0 +1,240 @@
+"""
+Tiled analysis for high-resolution images.
+
+Small scratches on large panels get lost when the whole frame is downscaled by the model, so large
+images are cut into overlapping tiles that are analyzed concurrently. Each tile reports bounding boxes,
+which are mapped back to full-image pixel coordinates; defects seen twice in an overlap are merged and
+the severity summary is recomputed from the merged list.
+"""
+import asyncio
+import io
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from services.analysis_service import AnalysisService, DEFECT_CRITERIA
+
+# NumPy and Pillow are imported where used so they stay out of the API's cold start
+if TYPE_CHECKING:
+    import numpy as np
+
+SEVERITY_ORDER = ["low", "medium", "high", "critical"]
+
+TILE_PROMPT = """
+        You are an expert Quality Control Inspector for manufacturing.
+        This image is one tile cut from a high-resolution photo of a manufactured product.
+        Analyze it with extreme scrutiny; defects may be small and may be cut off at the tile edges.
+""" + DEFECT_CRITERIA + """
+        Provide a detailed analysis in the following JSON format:
+
+        {
+            "defects": [
+                {"name": "Defect Name", "description": "Detailed description of the defect", "location": "Specific location on object",
+                 "severity": "critical/high/medium/low", "bbox": [x_min, y_min, x_max, y_max]}
+            ],
+            "severity_breakdown": {
+                "critical": 0,
+                "high": 0,
+                "medium": 0,
+                "low": 0
+            },
+            "overall_severity": "Critical/High/Medium/Low",
+            "quality_issues": ["List of general quality issues found"],
+            "recommendations": ["List of actionable recommendations"]
+        }
+
+        "bbox" is the defect's bounding box as fractions (0 to 1) of this tile's width and height.
+        IMPORTANT: Return ONLY the JSON string. No markdown formatting.
+        """
+
+
+def tile_boxes(width: int, height: int, tile_size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """(x0, y0, x1, y1) boxes covering the image, spread evenly so neighbours overlap by at least `overlap`."""
+    stride = max(1, tile_size - overlap)
+
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        count = -(-(length - overlap) // stride)  # ceil
+        count = max(count, 2)
+        return [round(i * (length - tile_size) / (count - 1)) for i in range(count)]
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def _severity(value: Any, fallback: str = "medium") -> str:
+    value = str(value or "").strip().lower()
+    return value if value in SEVERITY_ORDER else fallback
+
+
+def _overlap_ratio(a: List[int], b: List[int]) -> float:
+    """Intersection over the smaller box, so a partial defect at a tile edge still matches the full one."""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return ix * iy / smaller if smaller > 0 else 0.0
+
+
+def _same_kind(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    name_a = str(a.get("name", "")).strip().lower()
+    name_b = str(b.get("name", "")).strip().lower()
+    return not name_a or not name_b or name_a in name_b or name_b in name_a
+
+
+class TiledAnalyzer:
+    def __init__(self, service: AnalysisService, tile_size: int = 1024, overlap: int = 128, max_concurrency: int = 4, min_pixels: int = 4_000_000, merge_overlap: float = 0.5):
+        self.service = service
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_concurrency = max_concurrency
+        self.min_pixels = min_pixels
+        self.merge_overlap = merge_overlap
+
+    @classmethod
+    def from_env(cls, service: AnalysisService) -> "TiledAnalyzer":
+        return cls(
+            service,
+            tile_size=int(os.getenv("TILE_SIZE", "1024")),
+            overlap=int(os.getenv("TILE_OVERLAP", "128")),
+            max_concurrency=int(os.getenv("TILE_CONCURRENCY", "4")),
+            min_pixels=int(os.getenv("TILING_MIN_PIXELS", "4000000")),
+        )
+
+    def should_tile(self, image_path: str) -> bool:
+        """Only reads the image header."""
+        from PIL import Image
+
+        try:
+            with Image.open(image_path) as image:
+                width, height = image.size
+        except Exception as e:
+            print(f"Could not read image size of {image_path}: {e}")
+            return False
+        return width * height >= self.min_pixels
+
+    async def analyze(self, image_path: str, usage: Optional[List[Dict[str, Any]]] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+
+        # Decode once; every tile below is a NumPy view into this buffer, not a copy
+        pixels = await asyncio.to_thread(self._decode, image_path)
+        height, width = pixels.shape[:2]
+        boxes = tile_boxes(width, height, self.tile_size, self.overlap)
+        print(f"Analyzing {image_path} as {len(boxes)} tiles of up to {self.tile_size}px")
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_tile(box):
+            x0, y0, x1, y1 = box
+            async with semaphore:
+                tile_started = time.perf_counter()
+                # The JPEG encoder is the only place the tile's pixels are copied
+                data = await asyncio.to_thread(self._encode, pixels[y0:y1, x0:x1])
+                result = await self.service.analyze_image_data(data, "image/jpeg", prompt=TILE_PROMPT, usage=usage, deadline=deadline)
+                return result, time.perf_counter() - tile_started
+
+        outcomes = await asyncio.gather(*[run_tile(box) for box in boxes])
+
+        failed = [index for index, (result, _) in enumerate(outcomes) if result.get("error")]
+        tiling = {
+            "tile_count": len(boxes),
+            "tile_size": self.tile_size,
+            "overlap": self.overlap,
+            "failed_tiles": failed,
+            "tile_latency_ms": [round(latency * 1000) for _, latency in outcomes],
+            "total_ms": round((time.perf_counter() - started) * 1000),
+        }
+
+        if len(failed) == len(boxes):
+            # Nothing to merge; surface the first tile's error
+            result = dict(outcomes[0][0])
+            result["tiling"] = tiling
+            return result
+
+        merged = self._merge([(box, result) for box, (result, _) in zip(boxes, outcomes) if not result.get("error")])
+        merged["tiling"] = tiling
+        if failed:
+            message = f"{len(failed)} of {len(boxes)} image tiles could not be analyzed"
+            merged["quality_issues"].append(message)
+            # Unanalyzed tiles may hide defects, so a partial result must not pass as a completed inspection.
+            # The defects that were found stay in the result for reference.
+            merged["error"] = f"{message}: {outcomes[failed[0]][0]['error']}"
+        return merged
+
+    @staticmethod
+    def _decode(image_path: str) -> "np.ndarray":
+        import numpy as np
+        from PIL import Image
+
+        with Image.open(image_path) as image:
+            return np.asarray(image.convert("RGB"))
+
+    @staticmethod
+    def _encode(tile: "np.ndarray") -> bytes:
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.fromarray(tile).save(buffer, format="JPEG", quality=92)
+        return buffer.getvalue()
+
+    def _merge(self, tiles: List[Tuple[Tuple[int, int, int, int], Dict[str, Any]]]) -> Dict[str, Any]:
+        defects: List[Dict[str, Any]] = []
+        quality_issues: List[str] = []
+        recommendations: List[str] = []
+
+        for (x0, y0, x1, y1), result in tiles:
+            tile_severity = _severity(result.get("overall_severity"))
+            for defect in result["defects"]:
+                if not isinstance(defect, dict):
+                    continue
+                defect = dict(defect)
+                defect["severity"] = _severity(defect.get("severity"), tile_severity)
+                bbox = defect.get("bbox")
+                if isinstance(bbox, list) and len(bbox) == 4 and all(isinstance(v, (int, float)) for v in bbox):
+                    # Tile fractions -> full-image pixels
+                    bx0, by0, bx1, by1 = [min(1.0, max(0.0, float(v))) for v in bbox]
+                    tile_w, tile_h = x1 - x0, y1 - y0
+                    defect["bbox"] = [
+                        round(x0 + min(bx0, bx1) * tile_w), round(y0 + min(by0, by1) * tile_h),
+                        round(x0 + max(bx0, bx1) * tile_w), round(y0 + max(by0, by1) * tile_h),
+                    ]
+                else:
+                    defect.pop("bbox", None)
+                self._add_or_merge(defects, defect)
+
+            for issue in result["quality_issues"]:
+                if issue not in quality_issues:
+                    quality_issues.append(issue)
+            for recommendation in result["recommendations"]:
+                if recommendation not in recommendations:
+                    recommendations.append(recommendation)
+
+        breakdown = {severity: 0 for severity in ["critical", "high", "medium", "low"]}
+        for defect in defects:
+            breakdown[defect["severity"]] += 1
+        worst = max((SEVERITY_ORDER.index(defect["severity"]) for defect in defects), default=0)
+
+        return {
+            "defects": defects,
+            "severity_breakdown": breakdown,
+            "overall_severity": SEVERITY_ORDER[worst].capitalize(),
+            "quality_issues": quality_issues,
+            "recommendations": recommendations,
+        }
+
+    def _add_or_merge(self, defects: List[Dict[str, Any]], defect: Dict[str, Any]) -> None:
+        bbox = defect.get("bbox")
+        if bbox:
+            for existing in defects:
+                other = existing.get("bbox")
+                if other and _same_kind(existing, defect) and _overlap_ratio(bbox, other) >= self.merge_overlap:
+                    existing["bbox"] = [min(bbox[0], other[0]), min(bbox[1], other[1]), max(bbox[2], other[2]), max(bbox[3], other[3])]
+                    if SEVERITY_ORDER.index(defect["severity"]) > SEVERITY_ORDER.index(existing["severity"]):
+                        existing["severity"] = defect["severity"]
+                    if len(str(defect.get("description", ""))) > len(str(existing.get("description", ""))):
+                        existing["description"] = defect["description"]
+                    return
+        defects.append(defect)
@@ -0,0 +1,166 @@
+"""
+Frame sampling for inspection videos.
+
+sample_frames() runs in a worker process (OpenCV decoding is CPU-bound and holds the GIL for long
+stretches). It reads the clip sequentially and keeps only a small thumbnail of the last kept frame plus
+the hashes of kept frames, so memory stays flat regardless of clip length.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+THUMBNAIL_SIZE = (64, 64)
+
+
+def sample_frames(
+    video_path: str,
+    output_dir: str,
+    interval_seconds: float = 1.0,
+    scene_threshold: float = 30.0,
+    dedupe_distance: int = 6,
+    max_frames: int = 60,
+    checks_per_second: float = 5.0,
+) -> Dict[str, Any]:
+    """
+    Picks frames every `interval_seconds`, plus any frame whose thumbnail differs from the last kept
+    frame by more than `scene_threshold` (mean absolute grey-level difference, 0-255; 0 disables).
+    Candidates within `dedupe_distance` pHash bits of an already kept frame are dropped.
+    Kept frames are written to `output_dir` as JPEGs.
+    """
+    import cv2
+    import numpy as np
+
+    from services.phash import MultiIndexHashTable, phash_array
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {video_path}")
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    interval_frames = max(1, round(interval_seconds * fps))
+    # Scene changes are checked a few times per second; frames in between are only grabbed, not decoded
+    check_frames = max(1, round(fps / checks_per_second)) if scene_threshold > 0 else interval_frames
+
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    kept_hashes = MultiIndexHashTable(dedupe_distance)
+    last_thumbnail = None
+    frames: List[Dict[str, Any]] = []
+    candidates = 0
+    duplicates = 0
+    frame_index = -1
+
+    try:
+        while len(frames) < max_frames:
+            frame_index += 1
+            on_interval = frame_index % interval_frames == 0
+            if not on_interval and frame_index % check_frames != 0:
+                if not capture.grab():
+                    break
+                continue
+
+            ok, frame = capture.read()
+            if not ok:
+                break
+
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+            scene_change = (
+                scene_threshold > 0
+                and last_thumbnail is not None
+                and float(np.abs(thumbnail - last_thumbnail).mean()) > scene_threshold
+            )
+            if not (on_interval or scene_change or last_thumbnail is None):
+                continue
+
+            candidates += 1
+            value = phash_array(gray)
+            if kept_hashes.search(value):
+                duplicates += 1
+                continue
+
+            filename = f"{stem}_f{frame_index:06d}.jpg"
+            cv2.imwrite(os.path.join(output_dir, filename), frame, [cv2.IMWRITE_JPEG_QUALITY, 92])
+            kept_hashes.add(value, frame_index)
+            last_thumbnail = thumbnail
+            frames.append({
+                "filename": filename,
+                "frame_index": frame_index,
+                "timestamp": round(frame_index / fps, 3),
+                "phash": f"{value:016x}",
+                "reason": "scene_change" if scene_change and not on_interval else "interval",
+            })
+
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        capture.release()
+
+    return {
+        "fps": fps,
+        "duration_seconds": round(frame_count / fps, 3) if frame_count else None,
+        "frames_read": frame_index + 1,
+        "candidates": candidates,
+        "duplicates_dropped": duplicates,
+        "truncated": len(frames) >= max_frames,
+        "frames": frames,
+    }
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=int(os.getenv("VIDEO_WORKERS", "2")))
+    return _executor
+
+
+async def sample_frames_in_worker(video_path: str, output_dir: str, **options) -> Dict[str, Any]:
+    """Runs sample_frames in the shared worker process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _call_sample_frames, video_path, output_dir, options)
+
+
+def _call_sample_frames(video_path: str, output_dir: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    # run_in_executor doesn't forward keyword arguments
+    return sample_frames(video_path, output_dir, **options)
+
+
+def summarize_frames(frame_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Parent-inspection result built from the per-frame results, in the usual analysis shape.
+    Each defect is tagged with the frame it came from.
+    """
+    severity_order = ["low", "medium", "high", "critical"]
+    defects: List[Dict[str, Any]] = []
+    breakdown = {"critical": 0, "high": 0, "medium": 0, "low": 0}
+    quality_issues: List[str] = []
+    recommendations: List[str] = []
+    worst = None
+
+    for result in frame_results:
+        if result.get("error"):
+            continue
+        frame = result.get("frame", {})
+        for defect in result.get("defects", []):
+            if isinstance(defect, dict):
+                defects.append({**defect, "frame_index": frame.get("frame_index"), "timestamp": frame.get("timestamp")})
+        for key in breakdown:
+            breakdown[key] += int(result.get("severity_breakdown", {}).get(key, 0) or 0)
+        severity = str(result.get("overall_severity", "")).lower()
+        if severity in severity_order and (worst is None or severity_order.index(severity) > severity_order.index(worst)):
+            worst = severity
+        for issue in result.get("quality_issues", []):
+            if issue not in quality_issues:
+                quality_issues.append(issue)
+        for recommendation in result.get("recommendations", []):
+            if recommendation not in recommendations:
+                recommendations.append(recommendation)
+
+    return {
+        "defects": defects,
+        "severity_breakdown": breakdown,
+        "overall_severity": worst.capitalize() if worst else "Unknown",
+        "quality_issues": quality_issues,
+        "recommendations": recommendations,
+    }
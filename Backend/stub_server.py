@@ -0,0 +1,173 @@
+"""
+Local stand-in for the Gemini API, used for latency and load testing without spending quota.
+
+Run:
+    uvicorn stub_server:app --port 8100
+Then point the backend (or benchmark.py) at it:
+    ANALYSIS_STUB_URL=http://127.0.0.1:8100
+
+Behaviour is configured through environment variables:
+    STUB_LATENCY_MS       delay before the first token (default 800)
+    STUB_CHUNK_DELAY_MS   delay between streamed chunks (default 40)
+    STUB_CHUNK_SIZE       characters per streamed chunk (default 24)
+    STUB_DEFECTS          number of defects in the canned answer (default 3)
+    STUB_MAX_CONCURRENT   concurrent requests allowed before answering 429 (default 0 = unlimited)
+    STUB_QUOTA_RPM        requests allowed per rolling minute before answering 429 (default 0 = unlimited)
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+LATENCY_MS = int(os.getenv("STUB_LATENCY_MS", "800"))
+CHUNK_DELAY_MS = int(os.getenv("STUB_CHUNK_DELAY_MS", "40"))
+CHUNK_SIZE = int(os.getenv("STUB_CHUNK_SIZE", "24"))
+DEFECTS = int(os.getenv("STUB_DEFECTS", "3"))
+MAX_CONCURRENT = int(os.getenv("STUB_MAX_CONCURRENT", "0"))
+QUOTA_RPM = int(os.getenv("STUB_QUOTA_RPM", "0"))
+
+SEVERITIES = ["high", "medium", "low"]
+
+app = FastAPI(title="Gemini Stub")
+
+# Quota bookkeeping
+in_flight = 0
+recent_requests: deque = deque()
+stats = {"accepted": 0, "rejected": 0, "peak_concurrency": 0}
+
+
+class GenerateRequest(BaseModel):
+    model: str
+    prompt: str
+    images: int = 1
+    image_chars: int = 0
+
+
+def _canned_analysis() -> dict:
+    defects = [
+        {
+            "name": f"Surface scratch {i + 1}",
+            "description": "Thin linear scratch in the coating, approximately 4mm long.",
+            "location": f"Region {i + 1} of the upper face",
+            "severity": SEVERITIES[i % len(SEVERITIES)],
+            "bbox": [0.1 + 0.2 * i % 0.8, 0.4, 0.15 + 0.2 * i % 0.8, 0.45],
+        }
+        for i in range(DEFECTS)
+    ]
+    breakdown = {"critical": 0, "high": 0, "medium": 0, "low": 0}
+    for i in range(DEFECTS):
+        breakdown[SEVERITIES[i % len(SEVERITIES)]] += 1
+    return {
+        "defects": defects,
+        "severity_breakdown": breakdown,
+        "overall_severity": "High" if DEFECTS else "Low",
+        "quality_issues": ["Coating damage"] if DEFECTS else [],
+        "recommendations": ["Inspect the handling fixture for sharp edges"] if DEFECTS else [],
+    }
+
+
+def _answer(request: GenerateRequest) -> str:
+    if request.images > 1:
+        # Packed request: one entry per image
+        results = [{"image_index": i, **_canned_analysis()} for i in range(request.images)]
+        return json.dumps({"results": results}, indent=2)
+    return json.dumps(_canned_analysis(), indent=2)
+
+
+def _usage(request: GenerateRequest, text: str) -> dict:
+    # Rough Gemini-like accounting: ~4 chars per text token, 258 tokens per image
+    input_tokens = len(request.prompt) // 4 + 258 * request.images
+    output_tokens = len(text) // 4
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+    }
+
+
+def _generation_seconds(text: str) -> float:
+    chunks = (len(text) + CHUNK_SIZE - 1) // CHUNK_SIZE
+    return (LATENCY_MS + chunks * CHUNK_DELAY_MS) / 1000
+
+
+def _quota_exceeded() -> bool:
+    now = time.monotonic()
+    while recent_requests and now - recent_requests[0] > 60:
+        recent_requests.popleft()
+    if MAX_CONCURRENT and in_flight >= MAX_CONCURRENT:
+        return True
+    if QUOTA_RPM and len(recent_requests) >= QUOTA_RPM:
+        return True
+    return False
+
+
+def _admit() -> bool:
+    global in_flight
+    if _quota_exceeded():
+        stats["rejected"] += 1
+        return False
+    stats["accepted"] += 1
+    recent_requests.append(time.monotonic())
+    in_flight += 1
+    stats["peak_concurrency"] = max(stats["peak_concurrency"], in_flight)
+    return True
+
+
+def _done() -> None:
+    global in_flight
+    in_flight -= 1
+
+
+def _resource_exhausted() -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Stub quota exceeded"}},
+    )
+
+
+@app.post("/generate")
+async def generate(request: GenerateRequest):
+    if not _admit():
+        return _resource_exhausted()
+    try:
+        text = _answer(request)
+        # Non-streaming calls pay the full generation time before anything is returned
+        await asyncio.sleep(_generation_seconds(text))
+        return {"text": text, "usage": _usage(request, text)}
+    finally:
+        _done()
+
+
+@app.post("/stream")
+async def stream(request: GenerateRequest):
+    if not _admit():
+        return _resource_exhausted()
+    text = _answer(request)
+
+    async def chunks():
+        try:
+            await asyncio.sleep(LATENCY_MS / 1000)
+            for i in range(0, len(text), CHUNK_SIZE):
+                yield text[i:i + CHUNK_SIZE]
+                await asyncio.sleep(CHUNK_DELAY_MS / 1000)
+        finally:
+            _done()
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "in_flight": in_flight}
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    stats.update(accepted=0, rejected=0, peak_concurrency=0)
+    recent_requests.clear()
+    return stats
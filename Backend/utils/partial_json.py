@@ -0,0 +1,89 @@
+import ast
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_DEFECTS_KEY = re.compile(r'["\']defects["\']\s*:\s*\[')
+
+
+class DefectStreamParser:
+    """
+    Incrementally scans partial model output and returns each object of the
+    top-level "defects" array as soon as its closing brace has arrived.
+
+    Usage:
+        parser = DefectStreamParser()
+        for chunk in stream:
+            for defect in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos: Optional[int] = None  # Scan position once we are inside the defects array
+        self.depth = 0
+        self.quote: Optional[str] = None  # Quote character while inside a string
+        self.escape = False
+        self.object_start: Optional[int] = None
+        self.done = False
+        self.emitted = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Appends a chunk of model output and returns any newly completed defects."""
+        self.buffer += text
+        if self.done:
+            return []
+
+        if self.pos is None:
+            match = _DEFECTS_KEY.search(self.buffer)
+            if not match:
+                return []
+            self.pos = match.end()
+
+        found = []
+        buf = self.buffer
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.quote:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == self.quote:
+                    self.quote = None
+            elif ch in "\"'":
+                self.quote = ch
+            elif ch == "{":
+                if self.depth == 0:
+                    self.object_start = i
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0 and self.object_start is not None:
+                    defect = self._load(buf[self.object_start:i + 1])
+                    if isinstance(defect, dict):
+                        found.append(defect)
+                    self.object_start = None
+            elif ch == "]" and self.depth == 0:
+                # End of the defects array; the rest is handled by the final parse
+                self.done = True
+                i += 1
+                break
+            i += 1
+
+        self.pos = i
+        self.emitted += len(found)
+        return found
+
+    @staticmethod
+    def _load(fragment: str) -> Any:
+        try:
+            return json.loads(fragment)
+        except json.JSONDecodeError:
+            # Same fallback as the full parser: single-quoted Python dicts
+            try:
+                return ast.literal_eval(fragment)
+            except (ValueError, SyntaxError):
+                print(f"Skipping unparseable streamed defect: {fragment[:100]}")
+                return None
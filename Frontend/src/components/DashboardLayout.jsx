@@ -1,9 +1,22 @@
 import React, { useState, useEffect } from 'react';
 import { Outlet, useOutletContext } from 'react-router-dom';
 import Sidebar from './Sidebar';
-import { getUserInspections } from '../services/api';
+import { getUserInspections, subscribeToInspections } from '../services/api';
 import { auth } from '../firebase/auth';
 
+const toListItem = (item) => ({
+    id: String(item.id),
+    imageUrl: item.image_url || 'https://placehold.co/600x400/1e293b/cbd5e1?text=No+Image',
+    defectCount: item.analysis_result?.defects?.length || 0,
+    severity: item.analysis_result?.overall_severity || 'Unknown',
+    date: item.created_at ? new Date(item.created_at).toLocaleDateString() : new Date().toLocaleDateString(),
+    status: item.status,
+    errorMessage: item.analysis_result?.error || null,
+    created_at: item.created_at // Keep original for sorting
+});
+
+const byNewest = (a, b) => new Date(b.created_at) - new Date(a.created_at);
+
 const DashboardLayout = () => {
     const [isSidebarOpen, setIsSidebarOpen] = useState(true);
     const [inspections, setInspections] = useState([]);
@@ -17,18 +30,7 @@ const DashboardLayout = () => {
                 const token = await user.getIdToken();
                 const data = await getUserInspections(token);
                 if (Array.isArray(data)) {
-                    const mappedData = data.map(item => ({
-                        id: String(item.id),
-                        imageUrl: item.image_url || 'https://placehold.co/600x400/1e293b/cbd5e1?text=No+Image',
-                        defectCount: item.analysis_result?.defects?.length || 0,
-                        severity: item.analysis_result?.overall_severity || 'Unknown',
-                        date: item.created_at ? new Date(item.created_at).toLocaleDateString() : new Date().toLocaleDateString(),
-                        status: item.status,
-                        errorMessage: item.analysis_result?.error || null,
-                        created_at: item.created_at // Keep original for sorting
-                    }));
-                    mappedData.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
-                    setInspections(mappedData);
+                    setInspections(data.map(toListItem).sort(byNewest));
                 }
             }
         } catch (error) {
@@ -38,14 +40,38 @@ const DashboardLayout = () => {
         }
     };
 
+    // Applies a live event from the server to the list, so it stays current without polling
+    const handleInspectionEvent = (event) => {
+        if (event.type === 'resync') {
+            // Events were missed; the full list is the only reliable state
+            fetchInspections();
+        } else if (event.type === 'inspection.deleted') {
+            setInspections(prev => prev.filter(item => item.id !== String(event.data.id)));
+        } else if (event.type === 'inspection.created' || event.type === 'inspection.updated') {
+            // Video frames are only listed through their parent inspection
+            if (event.data.parent_id) return;
+            const updated = toListItem(event.data);
+            setInspections(prev => [updated, ...prev.filter(item => item.id !== updated.id)].sort(byNewest));
+        }
+    };
+
     useEffect(() => {
-        // Initial fetch
+        let closeEvents = null;
         const unsubscribe = auth.onAuthStateChanged((user) => {
+            if (closeEvents) {
+                closeEvents();
+                closeEvents = null;
+            }
             if (user) {
+                // Initial fetch, then live updates
                 fetchInspections();
+                closeEvents = subscribeToInspections(() => user.getIdToken(), handleInspectionEvent);
             }
         });
-        return () => unsubscribe();
+        return () => {
+            unsubscribe();
+            if (closeEvents) closeEvents();
+        };
     }, []);
 
     return (
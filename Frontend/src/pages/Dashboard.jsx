@@ -1,55 +1,15 @@
 import React, { useState, useEffect } from 'react';
 import UploadButton from '../components/UploadButton';
 import ImageUploadModal from '../components/ImageUploadModal';
-import { getUserInspections } from '../services/api';
-import { auth } from '../firebase/auth';
 import { useOutletContext } from 'react-router-dom';
 
 const Dashboard = () => {
     const [isModalOpen, setIsModalOpen] = useState(false);
-    const [inspections, setInspections] = useState([]);
-    const [loading, setLoading] = useState(true);
-    const { fetchInspections: refreshSidebar } = useOutletContext() || {};
-
-    const fetchLocalInspections = async () => {
-        setLoading(true);
-        try {
-            const user = auth.currentUser;
-            if (!user) return;
-
-            const token = await user.getIdToken();
-            const data = await getUserInspections(token);
-
-            if (Array.isArray(data)) {
-                const mappedData = data.map(item => ({
-                    id: String(item.id),
-                    imageUrl: item.image_url || 'https://placehold.co/600x400/1e293b/cbd5e1?text=No+Image',
-                    defectCount: item.analysis_result?.defects?.length || 0,
-                    severity: item.analysis_result?.overall_severity || 'Unknown',
-                    date: item.created_at ? new Date(item.created_at).toLocaleDateString() : new Date().toLocaleDateString(),
-                    status: item.status,
-                    errorMessage: item.analysis_result?.error || null,
-                    created_at: item.created_at
-                }));
-                mappedData.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
-                setInspections(mappedData);
-            } else {
-                setInspections([]);
-            }
-        } catch (err) {
-            console.error(err);
-        } finally {
-            setLoading(false);
-        }
-    };
-
-    useEffect(() => {
-        fetchLocalInspections();
-    }, []);
+    // The layout keeps the list current from live inspection events
+    const { inspections = [], fetchInspections: refreshInspections } = useOutletContext() || {};
 
     const handleUploadSuccess = (newInspection) => {
-        fetchLocalInspections();
-        if (refreshSidebar) refreshSidebar();
+        if (refreshInspections) refreshInspections();
     };
 
     const [mounted, setMounted] = useState(false);
@@ -41,6 +41,58 @@ export const uploadImage = async (file, token) => {
     }
 };
 
+// Streams the analysis as Server-Sent Events. `onEvent(event, data)` is called for
+// `inspection`, each `defect` as soon as it is generated, and the final `result`.
+export const uploadImageStream = async (file, token, onEvent) => {
+    const formData = new FormData();
+    formData.append('file', file);
+
+    try {
+        const response = await fetch(`${API_BASE_URL}/upload/stream`, {
+            method: 'POST',
+            body: formData,
+            headers: getHeaders(token)
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({}));
+            throw new Error(errorData.detail || `Upload failed: ${response.status} ${response.statusText}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let result = null;
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                for (const line of frame.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                const parsed = data ? JSON.parse(data) : null;
+                if (event === 'result') result = parsed;
+                if (onEvent) onEvent(event, parsed);
+            }
+        }
+
+        return result;
+    } catch (error) {
+        console.error('Error streaming upload:', error);
+        throw error;
+    }
+};
+
 export const getInspections = async () => {
     try {
         const response = await fetch(`${API_BASE_URL}/inspections`);
@@ -116,6 +168,26 @@ export const deleteInspection = async (id, token) => {
     }
 };
 
+// Deletes several inspections in one request. Resolves to { deleted: [...ids], not_found: [...ids] }.
+export const deleteInspections = async (ids, token) => {
+    try {
+        const response = await fetch(`${API_BASE_URL}/inspections`, {
+            method: 'DELETE',
+            headers: { ...getHeaders(token), 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ids })
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({}));
+            throw new Error(errorData.detail || `Failed to delete inspections: ${response.statusText}`);
+        }
+        return await response.json();
+    } catch (error) {
+        console.error('Error deleting inspections:', error);
+        throw error;
+    }
+};
+
 export const exportInspection = async (id, token) => {
     const headers = {};
     if (token) {
@@ -136,3 +208,48 @@ export const exportInspection = async (id, token) => {
         throw error;
     }
 };
+
+// Subscribes to the user's inspection events over WebSocket. `onEvent(event)` receives
+// `inspection.created` / `inspection.updated` (data: the inspection) and `inspection.deleted`
+// (data: { id }), plus `resync` when the list should be refetched with getUserInspections.
+// `getToken` is called on every (re)connect so an expired Firebase token is refreshed. The token is
+// sent as the first message rather than in the URL, where it would end up in access logs.
+// Returns a function that closes the subscription.
+export const subscribeToInspections = (getToken, onEvent) => {
+    const wsBase = API_BASE_URL.replace(/^http/, 'ws');
+    let socket = null;
+    let lastEventId = null;
+    let closed = false;
+    let retryDelay = 1000;
+
+    const connect = async () => {
+        const token = await getToken();
+        if (closed) return;
+
+        const query = lastEventId !== null ? `?last_event_id=${lastEventId}` : '';
+        socket = new WebSocket(`${wsBase}/ws/inspections${query}`);
+
+        socket.onopen = () => {
+            retryDelay = 1000;
+            socket.send(JSON.stringify({ type: 'auth', token }));
+        };
+        socket.onmessage = (message) => {
+            const event = JSON.parse(message.data);
+            if (event.type === 'heartbeat') return;
+            if (event.id !== undefined) lastEventId = event.id;
+            onEvent(event);
+        };
+        socket.onclose = () => {
+            if (closed) return;
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        };
+    };
+
+    connect().catch((error) => console.error('Error subscribing to inspections:', error));
+
+    return () => {
+        closed = true;
+        if (socket) socket.close();
+    };
+};